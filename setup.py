@@ -2,7 +2,7 @@ from setuptools import find_packages
 from setuptools import setup
 from vcstool import __version__
 
-install_requires = ['PyYAML', 'setuptools']
+install_requires = ['PyYAML']
 
 setup(
     name='vcstool',
@@ -40,6 +40,7 @@ Currently it supports git, hg, svn and bzr.',
             'vcs-branch = vcstool.commands.branch:main',
             'vcs-bzr = vcstool.commands.custom:bzr_main',
             'vcs-custom = vcstool.commands.custom:main',
+            'vcs-daemon = vcstool.commands.daemon:main',
             'vcs-diff = vcstool.commands.diff:main',
             'vcs-export = vcstool.commands.export:main',
             'vcs-git = vcstool.commands.custom:git_main',
@@ -0,0 +1,252 @@
+from contextlib import redirect_stderr
+from io import StringIO
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from vcstool import crawler  # noqa: E402
+from vcstool.commands.command import get_input_repositories  # noqa: E402
+from vcstool.crawler import _scan_directory  # noqa: E402
+from vcstool.crawler import find_repositories  # noqa: E402
+from vcstool.daemon import InotifyWatcher  # noqa: E402
+from vcstool.daemon import WatchedRepositoryIndex  # noqa: E402
+from vcstool.executor import DuplicateCommandHandler  # noqa: E402
+from vcstool.executor import generate_jobs  # noqa: E402
+from vcstool.index import RepositoryIndex  # noqa: E402
+
+
+class StatusCommand(object):
+
+    command = 'status'
+
+
+class TestFindRepositories(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        self.root = self._tempdir.name
+        for path in (
+            'b/.git', 'a/.hg', 'a/nested/.git', 'c/d/.svn', 'c/e/.bzr',
+            'f/.unknown',
+        ):
+            os.makedirs(os.path.join(self.root, path))
+        # a file with the name of a metadata directory isn't a repository
+        with open(os.path.join(self.root, 'f', '.git'), 'w'):
+            pass
+        os.symlink(
+            os.path.join(self.root, 'c'), os.path.join(self.root, 'g'))
+
+    def tearDown(self):
+        self._tempdir.cleanup()
+
+    def _find(self, paths, nested=False, **kwargs):
+        repos = find_repositories(
+            [os.path.join(self.root, p) for p in paths], nested=nested,
+            **kwargs)
+        return [
+            (os.path.relpath(repo.path, self.root), repo.type)
+            for repo in repos]
+
+    def test_sorted(self):
+        self.assertEqual(self._find(['.']), [
+            ('a', 'hg'), ('b', 'git'), ('c/d', 'svn'), ('c/e', 'bzr'),
+            ('g/d', 'svn'), ('g/e', 'bzr')])
+
+    def test_nested(self):
+        self.assertEqual(self._find(['.'], nested=True), [
+            ('a', 'hg'), ('a/nested', 'git'), ('b', 'git'), ('c/d', 'svn'),
+            ('c/e', 'bzr'), ('g/d', 'svn'), ('g/e', 'bzr')])
+
+    def test_paths(self):
+        # the paths are crawled in the given order, a directory is only
+        # visited once
+        self.assertEqual(self._find(['c', 'a', 'c/d']), [
+            ('c/d', 'svn'), ('c/e', 'bzr'), ('a', 'hg')])
+        self.assertEqual(self._find(['missing']), [])
+
+    def test_symlinks(self):
+        os.symlink(self.root, os.path.join(self.root, 'c', 'd', 'loop'))
+        os.symlink(
+            os.path.join(self.root, 'b'), os.path.join(self.root, 'c', 'b'))
+        repos = find_repositories([self.root], nested=True)
+        self.assertEqual(
+            [os.path.relpath(repo.path, self.root) for repo in repos], [
+                'a', 'a/nested', 'b', 'c/b', 'c/d', 'c/e', 'g/b', 'g/d',
+                'g/e'])
+        # the duplicates are detected without resolving the paths again
+        jobs = generate_jobs(repos, StatusCommand())
+        outputs = {
+            os.path.relpath(job['client'].path, self.root):
+            job['client'].status(None)['output']
+            for job in jobs
+            if isinstance(job['client'].status, DuplicateCommandHandler)}
+        self.assertEqual(outputs, {
+            'c/b': "Same repository as '%s'" % repos[2].path,
+            'g/b': "Same repository as '%s'" % repos[2].path,
+            'g/d': "Same repository as '%s'" % repos[4].path,
+            'g/e': "Same repository as '%s'" % repos[5].path})
+
+    def test_index(self):
+        # the directories must not have been modified recently to be indexed
+        past = time.time() - 60
+        for dirpath, dirnames, _ in os.walk(self.root):
+            for name in dirnames:
+                os.utime(os.path.join(dirpath, name), (past, past))
+            os.utime(dirpath, (past, past))
+        index_path = self.root + '-index'
+        self.addCleanup(shutil.rmtree, index_path)
+
+        index = RepositoryIndex(index_path)
+        self.assertEqual(self._find(['.'], index=index), self._find(['.']))
+        index.save()
+        # an index file is stored for each base path
+        self.assertEqual(len(os.listdir(index_path)), 1)
+
+        # the listings of unmodified directories are taken from the index
+        index = RepositoryIndex(index_path)
+        index.load()
+        index.add_root(self.root)
+        listing = index.directories[os.path.join(self.root, 'b')]
+        self.assertEqual(listing[1:], ['git', None])
+        listing[1] = 'hg'
+        self.assertIn(('b', 'hg'), self._find(['.'], index=index))
+        # but a nested crawl needs to list the subdirectories of repositories
+        self.assertIn(
+            ('b', 'git'), self._find(['.'], nested=True, index=index))
+
+        # modified directories are listed again
+        os.makedirs(os.path.join(self.root, 'h', '.git'))
+        self.assertIn(('h', 'git'), self._find(['.'], index=index))
+
+    def test_warm_index(self):
+        past = time.time() - 60
+        for dirpath, dirnames, _ in os.walk(self.root):
+            for name in dirnames:
+                os.utime(os.path.join(dirpath, name), (past, past))
+            os.utime(dirpath, (past, past))
+        index_path = self.root + '-index'
+        self.addCleanup(shutil.rmtree, index_path)
+        index = RepositoryIndex(index_path)
+        index.load()
+        expected = self._find(['.'], nested=True, index=index)
+        index.save()
+        index_file = os.path.join(index_path, os.listdir(index_path)[0])
+        os.utime(index_file, (past, past))
+
+        # a warm crawl neither lists any directory nor hands them to the
+        # threads, it only checks their modification times
+        scans = []
+
+        def scan_directory(*args):
+            scans.append(threading.current_thread())
+            return _scan_directory(*args)
+
+        def list_directory(*args):
+            self.fail('no directory should be listed')
+
+        self._replace(crawler, '_scan_directory', scan_directory)
+        self._replace(crawler, '_list_directory', list_directory)
+        index = RepositoryIndex(index_path)
+        index.load()
+        self.assertEqual(
+            self._find(['.'], nested=True, index=index), expected)
+        index.save()
+        self.assertTrue(scans)
+        self.assertEqual(set(scans), {threading.main_thread()})
+        # the unchanged index file isn't written again
+        self.assertEqual(os.path.getmtime(index_file), past)
+
+    def _replace(self, module, name, value):
+        self.addCleanup(setattr, module, name, getattr(module, name))
+        setattr(module, name, value)
+
+    def test_pruning(self):
+        os.makedirs(os.path.join(self.root, 'a', '.hg', 'store', '.git'))
+        os.makedirs(os.path.join(self.root, 'build', 'x', '.git'))
+        os.makedirs(os.path.join(self.root, 'c', 'build', '.git'))
+        # metadata directories are never searched
+        self.assertNotIn(
+            ('a/.hg/store', 'git'), self._find(['.'], nested=True))
+
+        self.assertEqual(self._find(['.'], exclude=['build/', 'g']), [
+            ('a', 'hg'), ('b', 'git'), ('c/d', 'svn'), ('c/e', 'bzr')])
+        # the symlinked directory isn't crawled again but has the same
+        # repositories as the one it points to
+        self.assertEqual(self._find(['.'], exclude=['/build', 'c/e']), [
+            ('a', 'hg'), ('b', 'git'), ('c/build', 'git'), ('c/d', 'svn'),
+            ('g/build', 'git'), ('g/d', 'svn')])
+        with open(os.path.join(self.root, '.vcsignore'), 'w') as h:
+            h.write('# comment\nbuild\n\n[ag]\n')
+        self.assertEqual(self._find(['.']), [
+            ('b', 'git'), ('c/d', 'svn'), ('c/e', 'bzr')])
+
+        self.assertEqual(self._find(['.'], max_depth=0), [])
+        self.assertEqual(self._find(['a'], max_depth=0), [('a', 'hg')])
+        self.assertEqual(self._find(['.'], max_depth=1), [('b', 'git')])
+        # the ignore file only applies to its base path
+        self.assertEqual(self._find(['c'], max_depth=1), [
+            ('c/build', 'git'), ('c/d', 'svn'), ('c/e', 'bzr')])
+
+
+class TestInputRepositories(unittest.TestCase):
+
+    def test_input(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'a'))
+            os.makedirs(os.path.join(root, 'b'))
+            input_file = StringIO(
+                'repositories:\n'
+                '  b: {type: git, url: "https://example.com/b.git"}\n'
+                '  a: {type: hg, url: "https://example.com/a"}\n'
+                '  missing: {type: git, url: "https://example.com/m.git"}\n')
+            stderr = StringIO()
+            with redirect_stderr(stderr):
+                clients = get_input_repositories([root], input_file)
+        # the repositories aren't searched but taken from the file as is
+        self.assertEqual(
+            [(os.path.relpath(c.path, root), c.type) for c in clients],
+            [('b', 'git'), ('a', 'hg')])
+        self.assertIn('missing', stderr.getvalue())
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'requires inotify')
+class TestWatchedRepositoryIndex(unittest.TestCase):
+
+    def test_watched(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'a', '.git'))
+            os.makedirs(os.path.join(root, 'b'))
+            past = time.time() - 60
+            for path in (root, os.path.join(root, 'a'),
+                         os.path.join(root, 'b')):
+                os.utime(path, (past, past))
+            index = WatchedRepositoryIndex()
+            index.watcher = InotifyWatcher(index.invalidate)
+
+            repos = find_repositories([root], index=index)
+            self.assertEqual([r.path for r in repos], [
+                os.path.join(root, 'a')])
+            # unmodified directories are neither listed nor checked again
+            listing = index.get_watched_listing(root, False)
+            self.assertEqual(listing[1:], (None, ['a', 'b']))
+            self.assertIsNotNone(
+                index.get_watched_listing(os.path.join(root, 'a'), False))
+
+            # modifications invalidate the listing
+            os.makedirs(os.path.join(root, 'b', '.hg'))
+            for _ in range(100):
+                if index.get_watched_listing(
+                    os.path.join(root, 'b'), False
+                ) is None:
+                    break
+                time.sleep(0.01)
+            self.assertIsNone(
+                index.get_watched_listing(os.path.join(root, 'b'), False))
+            self.assertIsNotNone(index.get_watched_listing(root, False))
+            repos = find_repositories([root], index=index)
+            self.assertEqual([r.type for r in repos], ['git', 'hg'])
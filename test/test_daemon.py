@@ -0,0 +1,169 @@
+from io import StringIO
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from vcstool import streams  # noqa: E402
+from vcstool.daemon import _ForwardedStdin  # noqa: E402
+from vcstool.daemon import forward_command  # noqa: E402
+from vcstool.daemon import is_running  # noqa: E402
+from vcstool.daemon import run_request  # noqa: E402
+from vcstool.daemon import stop  # noqa: E402
+from vcstool.executor import logger  # noqa: E402
+
+REPOS_FILE = 'repositories:\n  a:\n    type: git\n    url: %s\n'
+
+
+def create_repository(root):
+    path = os.path.join(root, 'origin')
+    for cmd in (
+        ['git', 'init', '--quiet', path],
+        ['git', '-C', path, '-c', 'user.name=vcstool',
+         '-c', 'user.email=vcstool@example.com',
+         'commit', '--quiet', '--allow-empty', '-m', 'initial'],
+    ):
+        subprocess.check_call(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return path
+
+
+class TestRunRequest(unittest.TestCase):
+
+    def test_stdin_and_state(self):
+        with tempfile.TemporaryDirectory() as root:
+            url = create_repository(root)
+            messages = []
+
+            def send(message):
+                messages.append(message)
+                if message.get('read_stdin'):
+                    stdin.set_data(REPOS_FILE % url)
+
+            stdin = _ForwardedStdin(send)
+            cwd = os.getcwd()
+            environ = dict(os.environ)
+            sys_streams = (sys.stdin, sys.stdout, sys.stderr)
+            vcstool_streams = (streams.stdout, streams.stderr)
+            log_state = (logger.level, logger.propagate, logger.handlers[:])
+            returncode = run_request({
+                'args': ['validate', '--debug', '--input', '-'],
+                'cwd': root,
+                'env': dict(os.environ, VCSTOOL_TEST='1'),
+            }, send, stdin=stdin)
+
+            self.assertEqual(returncode, 0)
+            self.assertEqual(messages[0], {'read_stdin': True})
+            stdout = ''.join(m.get('stdout', '') for m in messages)
+            stderr = ''.join(m.get('stderr', '') for m in messages)
+            self.assertIn('Found git repository', stdout)
+            # the debug messages are sent to the client
+            self.assertIn("DEBUG:vcstool.executor:finished 'a'", stderr)
+            # the state of the daemon is restored after the request
+            self.assertEqual(os.getcwd(), cwd)
+            self.assertEqual(dict(os.environ), environ)
+            self.assertEqual((sys.stdin, sys.stdout, sys.stderr), sys_streams)
+            self.assertEqual((streams.stdout, streams.stderr), vcstool_streams)
+            self.assertEqual(
+                (logger.level, logger.propagate, logger.handlers), log_state)
+
+    def test_exception(self):
+        messages = []
+        returncode = run_request({
+            'args': ['status'], 'cwd': os.path.join(os.curdir, 'missing'),
+        }, messages.append)
+        self.assertEqual(returncode, 1)
+        self.assertIn(
+            'Traceback', ''.join(m.get('stderr', '') for m in messages))
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'requires Unix sockets')
+class TestForwardCommand(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        self.root = self._tempdir.name
+        self.socket_path = os.path.join(self.root, 'daemon.sock')
+        # the daemon changes the working directory and the standard streams
+        # of its process for each request
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = repo_root + os.pathsep + env.get('PYTHONPATH', '')
+        self._daemon = subprocess.Popen(
+            [sys.executable, os.path.join(repo_root, 'scripts', 'vcs'),
+             'daemon', '--no-watch', '--socket', self.socket_path],
+            stdout=subprocess.DEVNULL, env=env)
+        for _ in range(1000):
+            if is_running(self.socket_path):
+                break
+            time.sleep(0.01)
+
+    def tearDown(self):
+        stop(self.socket_path)
+        self._daemon.wait(10)
+        self._tempdir.cleanup()
+
+    def _forward(self, args, stdin=''):
+        previous = sys.stdin, sys.stdout, sys.stderr
+        sys.stdin, sys.stdout, sys.stderr = \
+            StringIO(stdin), StringIO(), StringIO()
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.root)
+            returncode = forward_command(args, socket_path=self.socket_path)
+            return returncode, sys.stdout.getvalue(), sys.stderr.getvalue()
+        finally:
+            os.chdir(cwd)
+            sys.stdin, sys.stdout, sys.stderr = previous
+
+    def test_forward(self):
+        url = create_repository(self.root)
+        returncode, stdout, _ = self._forward(
+            ['validate', '--input', '-'], stdin=REPOS_FILE % url)
+        self.assertEqual(returncode, 0)
+        self.assertIn("Found git repository '%s'" % url, stdout)
+
+        returncode, _, stderr = self._forward(['unknown'])
+        self.assertEqual(returncode, 1)
+        self.assertIn("'unknown' is not a vcs command", stderr)
+
+    def test_client_files(self):
+        # the files of the client are only readable by running locally
+        for args in (
+            ['validate', '--input', '/dev/stdin'],
+            ['import', '--input=/dev/fd/63'],
+        ):
+            self.assertIsNone(
+                forward_command(args, socket_path=self.socket_path))
+
+    def test_cancel_on_disconnect(self):
+        url = create_repository(self.root)
+        subprocess.check_call(
+            ['git', 'clone', '--quiet', url, os.path.join(self.root, 'a')],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        request = {
+            'args': [
+                'custom', '--git', '--args', '-c', 'alias.slp=!sleep 60',
+                'slp'],
+            'cwd': self.root,
+            'env': dict(os.environ),
+        }
+        sock.sendall((json.dumps(request) + '\n').encode())
+        time.sleep(1)
+        start = time.monotonic()
+        sock.close()
+        # the daemon serves the next request once the command is cancelled
+        returncode, _, _ = self._forward(['status', '--hide-empty'])
+        self.assertEqual(returncode, 0)
+        self.assertLess(time.monotonic() - start, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,795 @@
+import argparse
+from io import StringIO
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from vcstool import streams  # noqa: E402
+from vcstool.asyncio_executor import SubprocessLoop  # noqa: E402
+from vcstool.clients import vcs_base  # noqa: E402
+from vcstool.clients.vcs_base import cancel_commands  # noqa: E402
+from vcstool.clients.vcs_base import get_cancellation_reason  # noqa: E402
+from vcstool.clients.vcs_base import reset_cancellation  # noqa: E402
+from vcstool.clients.vcs_base import run_command  # noqa: E402
+from vcstool.clients.vcs_base import set_subprocess_records  # noqa: E402
+from vcstool.clients.vcs_base import VcsClientBase  # noqa: E402
+from vcstool.commands.command import add_common_arguments  # noqa: E402
+from vcstool.commands.command import get_execute_jobs_kwargs  # noqa: E402
+from vcstool.concurrency import AdaptiveConcurrency  # noqa: E402
+from vcstool.executor import ASYNCIO_MAX_PROCESSES  # noqa: E402
+from vcstool.executor import execute_jobs  # noqa: E402
+from vcstool.executor import Job  # noqa: E402
+from vcstool.executor import JobScheduler  # noqa: E402
+from vcstool.executor import LiveOutput  # noqa: E402
+from vcstool.executor import NdjsonOutput  # noqa: E402
+from vcstool.executor import OrderedOutput  # noqa: E402
+from vcstool.executor import output_repositories  # noqa: E402
+from vcstool.executor import Result  # noqa: E402
+from vcstool.executor import Worker  # noqa: E402
+from vcstool.history import DurationHistory  # noqa: E402
+from vcstool.hosts import CircuitBreaker  # noqa: E402
+from vcstool.hosts import get_host_limits  # noqa: E402
+from vcstool.hosts import get_url_host  # noqa: E402
+from vcstool.hosts import host_limit  # noqa: E402
+from vcstool.hosts import HostLimits  # noqa: E402
+from vcstool.progress import ProgressDisplay  # noqa: E402
+from vcstool.retry import classify_failure  # noqa: E402
+from vcstool.retry import PERMANENT  # noqa: E402
+from vcstool.retry import RetryPolicy  # noqa: E402
+from vcstool.retry import set_retry_policy  # noqa: E402
+from vcstool.retry import TRANSIENT  # noqa: E402
+from vcstool.streams import set_streams  # noqa: E402
+from vcstool.timings import Timings  # noqa: E402
+from vcstool.trace_events import Trace  # noqa: E402
+
+
+class Client(object):
+
+    type = 'dummy'
+
+    def __init__(self, path):
+        self.path = path
+
+    def echo(self, command):
+        return {
+            'cmd': 'echo',
+            'cwd': self.path,
+            'output': self.path,
+            'returncode': 0,
+        }
+
+    def python(self, command):
+        return run_command(
+            [sys.executable, '-c', command.code, self.path] +
+            getattr(command, 'args', []), os.curdir)
+
+    def slow(self, command):
+        # the deadline of the job is reached before invoking the command and
+        # the failure of the command isn't passed on
+        time.sleep(command.delay)
+        result = run_command([sys.executable, '-c', 'pass'], os.curdir)
+        return {
+            'cmd': result['cmd'],
+            'cwd': self.path,
+            'output': 'failed',
+            'returncode': 1,
+        }
+
+    def live(self, command):
+        # the output of the probe isn't part of the result
+        run_command([sys.executable, '-c', 'print("probe")'], os.curdir)
+        return run_command(
+            [sys.executable, '-c', command.code, self.path], os.curdir,
+            live=True)
+
+
+class EchoCommand(object):
+
+    command = 'echo'
+
+
+class PythonCommand(object):
+
+    command = 'python'
+
+    def __init__(self, code):
+        self.code = code
+
+
+class SlowCommand(object):
+
+    command = 'slow'
+
+    def __init__(self, delay):
+        self.delay = delay
+
+
+class LiveCommand(PythonCommand):
+
+    command = 'live'
+
+
+def create_job(path, depends=None):
+    job = {'client': Client(path), 'command': None}
+    if depends is not None:
+        job['depends'] = set(depends)
+    return job
+
+
+class TestJobAndResult(unittest.TestCase):
+
+    def test_mapping_access(self):
+        job = Job(client=Client('a'), command=None, custom=42)
+        self.assertEqual(job['custom'], 42)
+        self.assertNotIn('depends', job)
+        self.assertIsNone(job.get('host'))
+        job['depends'] = []
+        self.assertEqual(set(job), {'client', 'command', 'depends', 'custom'})
+
+        result = Result.create(
+            job, {'cmd': 'cmd', 'output': 'out', 'returncode': 0})
+        # keys of the job are looked up instead of being copied
+        self.assertIs(result['client'], job.client)
+        self.assertEqual(result['custom'], 42)
+        self.assertEqual(result['output'], 'out')
+        self.assertIn('depends', result)
+        self.assertNotIn('host', result)
+        self.assertIs(dict(result)['job'], job)
+
+
+class TestJobScheduler(unittest.TestCase):
+
+    def test_without_dependencies(self):
+        jobs = [create_job('b'), create_job('a'), create_job('c')]
+        scheduler = JobScheduler(jobs)
+        # ready jobs are handed out in their original order
+        self.assertEqual(
+            [scheduler.get_ready_job() for _ in jobs], jobs)
+        self.assertIsNone(scheduler.get_ready_job())
+        self.assertFalse(scheduler.has_pending_jobs())
+
+    def test_dependencies(self):
+        parent = create_job('a', depends=[])
+        child = create_job('a/b', depends=['a'])
+        grandchild = create_job('a/b/c', depends=['a', 'a/b'])
+        other = create_job('d', depends=[])
+        scheduler = JobScheduler([grandchild, child, parent, other])
+
+        self.assertIs(scheduler.get_ready_job(), parent)
+        self.assertIs(scheduler.get_ready_job(), other)
+        self.assertIsNone(scheduler.get_ready_job())
+        self.assertTrue(scheduler.has_pending_jobs())
+
+        scheduler.finish_job(other)
+        self.assertIsNone(scheduler.get_ready_job())
+        scheduler.finish_job(parent)
+        self.assertIs(scheduler.get_ready_job(), child)
+        self.assertIsNone(scheduler.get_ready_job())
+        scheduler.finish_job(child)
+        self.assertIs(scheduler.get_ready_job(), grandchild)
+        scheduler.finish_job(grandchild)
+        self.assertFalse(scheduler.has_pending_jobs())
+
+    def test_longest_first(self):
+        jobs = [create_job(path) for path in ('a', 'b', 'c', 'd')]
+        estimates = {'a': 1.0, 'b': 5.0, 'c': None, 'd': 2.0}
+        scheduler = JobScheduler(
+            jobs,
+            estimate_duration=lambda job: estimates[job['client'].path])
+        # the job without an estimate is assumed to take an average duration
+        self.assertEqual(
+            [scheduler.get_ready_job()['client'].path for _ in jobs],
+            ['b', 'c', 'd', 'a'])
+
+    def test_unknown_dependency(self):
+        # dependencies on paths without a job don't block
+        job = create_job('a/b', depends=['a'])
+        scheduler = JobScheduler([job])
+        self.assertIs(scheduler.get_ready_job(), job)
+
+    def test_host_limits(self):
+        jobs = []
+        for host, count in (('a.com', 4), ('b.com', 2), (None, 1)):
+            for i in range(count):
+                job = create_job('%s%d' % (host, i))
+                job['host'] = host
+                jobs.append(job)
+        scheduler = JobScheduler(
+            jobs, host_limits=HostLimits(default=2, overrides={'b.com': 1}))
+        # the hosts take turns until reaching their limit
+        started = [scheduler.get_ready_job() for _ in range(4)]
+        self.assertEqual(
+            [job['client'].path for job in started],
+            ['a.com0', 'b.com0', 'None0', 'a.com1'])
+        self.assertIsNone(scheduler.get_ready_job())
+        scheduler.finish_job(started[0])
+        self.assertEqual(scheduler.get_ready_job()['client'].path, 'a.com2')
+        self.assertIsNone(scheduler.get_ready_job())
+        scheduler.finish_job(started[1])
+        self.assertEqual(scheduler.get_ready_job()['client'].path, 'b.com1')
+
+
+class TestHosts(unittest.TestCase):
+
+    def test_url_host(self):
+        for url, host in (
+            ('https://user@GitHub.com:443/org/repo.git', 'github.com'),
+            ('ssh://git@gitlab.com/org/repo.git', 'gitlab.com'),
+            ('git@github.com:org/repo.git', 'github.com'),
+            ('example.org:repo', 'example.org'),
+            ('file:///tmp/repo', None),
+            ('/tmp/repo', None),
+            ('C:/repo', None),
+            ('', None),
+        ):
+            self.assertEqual(get_url_host(url), host, url)
+
+    def test_host_limits(self):
+        host_limits = get_host_limits([
+            host_limit('4'), host_limit('GitHub.com=8')])
+        self.assertEqual(host_limits.get_limit('github.com'), 8)
+        self.assertEqual(host_limits.get_limit('gitlab.com'), 4)
+        self.assertIsNone(host_limits.get_limit(None))
+        for value in ('0', 'x', '=3', 'host=-1'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                host_limit(value)
+
+
+class TestExecuteJobs(unittest.TestCase):
+
+    def test_results(self):
+        command = EchoCommand()
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('a', 'b', 'c')]
+        jobs[1]['depends'] = {'a'}
+        results = execute_jobs(jobs, number_of_workers=2)
+        self.assertEqual(
+            sorted(r['output'] for r in results), ['a', 'b', 'c'])
+        self.assertTrue(all(r['returncode'] == 0 for r in results))
+        # all workers have been stopped
+        self.assertFalse(
+            [t for t in threading.enumerate() if isinstance(t, Worker)])
+
+    def test_asyncio_executor(self):
+        command = PythonCommand('import sys; print(sys.argv[1])')
+        paths = ['repo%d' % i for i in range(20)]
+        jobs = [{'client': Client(path), 'command': command} for path in paths]
+        results = execute_jobs(
+            jobs, number_of_workers=8, executor='asyncio')
+        self.assertEqual(sorted(r['output'] for r in results), sorted(paths))
+        self.assertTrue(all(r['returncode'] == 0 for r in results))
+
+    def test_asyncio_max_processes(self):
+        # each process records the number of processes running concurrently
+        with tempfile.TemporaryDirectory() as tmpdir:
+            command = PythonCommand(
+                'import os, sys, time\n'
+                'path = os.path.join(sys.argv[2], sys.argv[1])\n'
+                'open(path, "w").close()\n'
+                'time.sleep(0.2)\n'
+                'print(len(os.listdir(sys.argv[2])))\n'
+                'os.remove(path)')
+            command.args = [tmpdir]
+            jobs = [
+                {'client': Client('repo%d' % i), 'command': command}
+                for i in range(8)]
+            results = execute_jobs(
+                jobs, number_of_workers=8, executor='asyncio',
+                max_processes=2)
+        self.assertEqual(len(results), 8)
+        self.assertLessEqual(max(int(r['output']) for r in results), 2)
+
+    def test_asyncio_number_of_workers(self):
+        parser = argparse.ArgumentParser()
+        add_common_arguments(parser)
+        for argv, number_of_workers in (
+            (['--executor', 'asyncio'], ASYNCIO_MAX_PROCESSES),
+            (['--executor', 'asyncio', '--max-processes', '100'], 100),
+            (['--executor', 'asyncio', '-w', '1'], 1),
+        ):
+            args = parser.parse_args(argv + ['--no-history'])
+            kwargs = get_execute_jobs_kwargs([], args)
+            self.assertEqual(kwargs['number_of_workers'], number_of_workers)
+        # e.g. import forcing a single worker for interactive prompts
+        args = parser.parse_args(['--executor', 'asyncio', '--no-history'])
+        kwargs = get_execute_jobs_kwargs([], args, number_of_workers=1)
+        self.assertEqual(kwargs['number_of_workers'], 1)
+
+    def test_adaptive_concurrency(self):
+        command = EchoCommand()
+        paths = ['repo%d' % i for i in range(20)]
+        jobs = [{'client': Client(path), 'command': command} for path in paths]
+        results = execute_jobs(
+            jobs, number_of_workers=8,
+            concurrency=AdaptiveConcurrency(1, 8))
+        self.assertEqual(sorted(r['output'] for r in results), sorted(paths))
+
+    def test_circuit_breaker(self):
+        command = PythonCommand(
+            'import sys; '
+            'print("fatal: Could not resolve host: " + sys.argv[1]); '
+            'sys.exit(128)')
+        jobs = []
+        for i in range(4):
+            job = {'client': Client('repo%d' % i), 'command': command}
+            job['host'] = 'dead.com'
+            jobs.append(job)
+        results = execute_jobs(
+            jobs, number_of_workers=1, circuit_breaker=CircuitBreaker(2))
+        results = {r['client'].path: r for r in results}
+        self.assertEqual(results['repo1']['returncode'], 128)
+        self.assertEqual(
+            results['repo2']['output'],
+            "Not started since 2 consecutive jobs for host 'dead.com' "
+            'failed to connect')
+        self.assertTrue(results['repo3']['host_unavailable'])
+
+    def test_circuit_breaker_timeout(self):
+        jobs = []
+        for i in range(2):
+            job = {'client': Client('repo%d' % i), 'command': SlowCommand(1)}
+            job['host'] = 'slow.com'
+            jobs.append(job)
+        results = execute_jobs(
+            jobs, number_of_workers=1, timeout=0.5,
+            circuit_breaker=CircuitBreaker(1))
+        results = {r['client'].path: r for r in results}
+        self.assertTrue(results['repo0']['timed_out'])
+        self.assertTrue(results['repo1']['host_unavailable'])
+
+    def test_timeout(self):
+        # the grandchild keeps the output pipe open unless it is killed too
+        command = PythonCommand(
+            'import subprocess, sys; '
+            'print(sys.argv[1], flush=True); '
+            'sys.argv[1] == "slow" and subprocess.call([sys.executable, '
+            '"-c", "import time; time.sleep(60)"])')
+        for executor in ('threads', 'asyncio'):
+            jobs = [
+                {'client': Client(path), 'command': command}
+                for path in ('fast', 'slow')]
+            start = time.monotonic()
+            results = execute_jobs(
+                jobs, number_of_workers=2, executor=executor, timeout=1)
+            self.assertLess(time.monotonic() - start, 10)
+            results = {r['client'].path: r for r in results}
+            self.assertEqual(results['fast']['returncode'], 0)
+            self.assertNotIn('timed_out', results['fast'])
+            self.assertEqual(results['slow']['returncode'], 124)
+            self.assertTrue(results['slow']['timed_out'])
+            self.assertEqual(
+                results['slow']['output'].splitlines(),
+                ['slow', 'Timed out after 1.0 seconds'])
+
+    @unittest.skipIf(sys.platform == 'win32', 'sessions are POSIX specific')
+    def test_interactive(self):
+        # interactive processes stay attached to the terminal to be able to
+        # prompt even if they might be killed
+        command = PythonCommand(
+            'import os; print(os.getsid(0) == os.getpid())')
+        for interactive, isolated in ((False, 'True'), (True, 'False')):
+            jobs = [{'client': Client('a'), 'command': command}]
+            results = execute_jobs(
+                jobs, timeout=10, fail_fast=True, interactive=interactive)
+            self.assertEqual(results[0]['output'], isolated)
+
+    def test_fail_fast(self):
+        command = PythonCommand(
+            'import subprocess, sys; '
+            'print(sys.argv[1], flush=True); '
+            'sys.argv[1] == "slow" and subprocess.call([sys.executable, '
+            '"-c", "import time; time.sleep(60)"]); '
+            'sys.exit(sys.argv[1] == "fail")')
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('slow', 'fail', 'pending1', 'pending2')]
+        start = time.monotonic()
+        results = execute_jobs(jobs, number_of_workers=2, fail_fast=True)
+        self.assertLess(time.monotonic() - start, 10)
+        results = {r['client'].path: r for r in results}
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results['fail']['returncode'], 1)
+        self.assertNotIn('cancelled', results['fail'])
+        self.assertTrue(results['slow']['cancelled'])
+        self.assertEqual(
+            results['slow']['output'].splitlines(),
+            ['slow', "Cancelled since the command failed in 'fail'"])
+        for path in ('pending1', 'pending2'):
+            self.assertTrue(results[path]['cancelled'])
+            self.assertEqual(
+                results[path]['output'],
+                "Not started since the command failed in 'fail'")
+
+    def test_deadline(self):
+        command = PythonCommand('import time; time.sleep(60)')
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('a', 'b', 'c')]
+        start = time.monotonic()
+        results = execute_jobs(
+            jobs, number_of_workers=1, deadline=start + 0.5)
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(
+            sorted(r['output'] for r in results), [
+                'Cancelled since the deadline has been reached',
+                'Not started since the deadline has been reached',
+                'Not started since the deadline has been reached'])
+        self.assertTrue(all(r['cancelled'] for r in results))
+
+    def test_deadline_progress(self):
+        # a progress character is output for the dropped jobs too
+        command = PythonCommand('import time; time.sleep(60)')
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('a', 'b', 'c', 'd')]
+        previous_stdout = streams.stdout
+        stdout = StringIO()
+        set_streams(stdout=stdout)
+        try:
+            execute_jobs(
+                jobs, show_progress=True, number_of_workers=1,
+                deadline=time.monotonic() + 0.5)
+        finally:
+            set_streams(stdout=previous_stdout)
+        self.assertEqual(stdout.getvalue(), 'CCCC\n')
+
+    @unittest.skipIf(sys.platform == 'win32', 'SIGINT is POSIX specific')
+    def test_interrupt(self):
+        command = PythonCommand('import time; time.sleep(60)')
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('a', 'b', 'c')]
+        timer = threading.Timer(
+            0.5, os.kill, args=(os.getpid(), signal.SIGINT))
+        timer.start()
+        start = time.monotonic()
+        results = execute_jobs(jobs, number_of_workers=2)
+        timer.join()
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(r['cancelled'] for r in results))
+        # the previous handler has been restored
+        self.assertIs(
+            signal.getsignal(signal.SIGINT), signal.default_int_handler)
+
+    def test_cancel_while_holding_lock(self):
+        # e.g. the SIGINT handler interrupting the main thread while it is
+        # registering a process
+        def cancel():
+            reset_cancellation()
+            with vcs_base._cancellation_lock:
+                cancel_commands('the execution has been interrupted')
+
+        thread = threading.Thread(target=cancel)
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(
+            get_cancellation_reason(), 'the execution has been interrupted')
+        reset_cancellation()
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+
+    def test_aimd(self):
+        concurrency = AdaptiveConcurrency(2, 16)
+
+        def finish_window(
+            throughput, duration=1.0, expected_duration=1.0, output=''
+        ):
+            # finish as many jobs as the current limit at the throughput
+            count = max(2, concurrency.limit)
+            for i in range(count):
+                self.now += 1.0 / throughput
+                concurrency.job_finished({
+                    'duration': duration, 'output': output,
+                    'returncode': 1 if output else 0}, now=self.now,
+                    expected_duration=expected_duration)
+
+        self.now = 0.0
+        # slow start doubles the limit while the throughput improves
+        finish_window(2.0)
+        self.assertEqual(concurrency.limit, 4)
+        finish_window(4.0)
+        self.assertEqual(concurrency.limit, 8)
+        # afterwards the limit is only increased additively, independent of
+        # the throughput
+        finish_window(4.0)
+        self.assertEqual(concurrency.limit, 9)
+        finish_window(4.0)
+        self.assertEqual(concurrency.limit, 10)
+        # transient network failures halve the limit
+        finish_window(4.0, output='fatal: unable to access: Connection reset')
+        self.assertEqual(concurrency.limit, 5)
+        # which grows again up to the maximum
+        for limit in range(6, 17):
+            finish_window(4.0)
+            self.assertEqual(concurrency.limit, limit)
+        finish_window(4.0)
+        self.assertEqual(concurrency.limit, 16)
+        # slow repositories don't indicate a congestion
+        finish_window(4.0, duration=3.0, expected_duration=3.0)
+        self.assertEqual(concurrency.limit, 16)
+        finish_window(4.0, duration=3.0, expected_duration=None)
+        self.assertEqual(concurrency.limit, 16)
+        # but a rising latency compared to the expected duration does
+        finish_window(4.0, duration=3.0, expected_duration=1.0)
+        self.assertEqual(concurrency.limit, 8)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_classify_failure(self):
+        for output, returncode, classification in (
+            ("fatal: unable to access 'x': Could not resolve host: x", 128,
+             TRANSIENT),
+            ('error: RPC failed; HTTP 502 curl 22', 128, TRANSIENT),
+            ('ERROR: Repository not found.\n'
+             'fatal: Could not read from remote repository.', 128,
+             PERMANENT),
+            ("fatal: couldn't find remote ref foo", 128, PERMANENT),
+            ('', 127, PERMANENT),
+            ('error: something else', 1, None),
+        ):
+            self.assertEqual(
+                classify_failure(output, returncode), classification, output)
+
+    def test_budget_and_delay(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=4.0, budget=2)
+        self.assertFalse(policy.should_retry(PERMANENT))
+        self.assertTrue(policy.should_retry(TRANSIENT))
+        self.assertTrue(policy.should_retry(None))
+        self.assertFalse(policy.should_retry(TRANSIENT))
+        for attempt, (minimum, maximum) in enumerate(
+            ((0.5, 1.0), (1.0, 2.0), (2.0, 4.0), (2.0, 4.0))
+        ):
+            delay = policy.get_delay(attempt)
+            self.assertTrue(minimum <= delay <= maximum, delay)
+
+    def test_run_command(self):
+        set_retry_policy(RetryPolicy(base_delay=0.01))
+        try:
+            client = VcsClientBase(os.curdir)
+            for output, attempts in (
+                ('ERROR: Repository not found.', 1),
+                ('fatal: Connection reset by peer', 3),
+            ):
+                records = []
+                set_subprocess_records(records)
+                result = client._run_command([
+                    sys.executable, '-c',
+                    'print(%r); raise SystemExit(128)' % output], retry=2)
+                self.assertEqual(result['returncode'], 128)
+                self.assertEqual(len(records), attempts)
+        finally:
+            set_subprocess_records(None)
+            set_retry_policy(RetryPolicy())
+
+
+class TestDurationHistory(unittest.TestCase):
+
+    def test_roundtrip(self):
+        command = EchoCommand()
+        job = {'client': Client('a'), 'command': command}
+        with tempfile.TemporaryDirectory() as basepath:
+            path = os.path.join(basepath, 'cache', 'durations.json')
+            history = DurationHistory(path)
+            history.load()
+            self.assertIsNone(history.get_duration(job))
+            result = dict(job)
+            result['duration'] = 4.0
+            history.add_result(result)
+            history.save()
+
+            history = DurationHistory(path)
+            history.load()
+            self.assertEqual(history.get_duration(job), 4.0)
+            # the recorded duration is smoothed across runs
+            result['duration'] = 2.0
+            history.add_result(result)
+            self.assertEqual(history.get_duration(job), 3.0)
+
+
+class TestProgressDisplay(unittest.TestCase):
+
+    def test_eta(self):
+        jobs = [create_job(path) for path in ('a', 'b', 'c', 'd')]
+        estimates = {'a': 10.0, 'b': 30.0, 'c': None, 'd': 20.0}
+        progress = ProgressDisplay(
+            StringIO(), jobs, 2,
+            estimate_duration=lambda job: estimates[job['client'].path])
+        now = time.monotonic()
+        # the job without an estimate is assumed to take an average duration
+        self.assertAlmostEqual(progress.get_eta(now), 40.0)
+        self.assertTrue(progress.get_line(now).startswith('[0/4], ETA 40s'))
+
+        # the estimates are scaled by the accuracy of the finished jobs
+        progress.job_finished(jobs[0], {'returncode': 0, 'duration': 20.0})
+        self.assertAlmostEqual(progress.get_eta(now), 70.0)
+        progress.job_finished(jobs[1], {'returncode': 1, 'duration': 60.0})
+        line = progress.get_line(now)
+        self.assertTrue(line.startswith('[2/4], 1 failed'), line)
+
+
+class TestTimings(unittest.TestCase):
+
+    def test_subprocesses(self):
+        command = PythonCommand('import sys; print(sys.argv[1])')
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('a', 'b')]
+        timings = Timings(output=False)
+        execute_jobs(jobs, number_of_workers=2, result_observers=[timings])
+        self.assertEqual(
+            sorted(job['path'] for job in timings.jobs), ['a', 'b'])
+        self.assertEqual(len(timings.subprocesses), 2)
+        for record in timings.subprocesses:
+            self.assertEqual(record['command'], 'python')
+            self.assertEqual(record['returncode'], 0)
+            self.assertTrue(record['cmd'].startswith(sys.executable))
+        for job in timings.jobs:
+            # the job includes the time of its subprocess
+            record = [
+                r for r in timings.subprocesses if r['path'] == job['path']][0]
+            self.assertGreaterEqual(job['duration'], record['duration'])
+        self.assertGreater(timings.get_wall_time(), 0)
+
+
+class TestTrace(unittest.TestCase):
+
+    def test_events(self):
+        command = PythonCommand('import sys; print(sys.argv[1])')
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('a', 'a/b')]
+        jobs[1]['depends'] = {'a'}
+        trace = Trace(None)
+        execute_jobs(jobs, number_of_workers=2, result_observers=[trace])
+        events = trace.get_events()
+
+        job_events = [e for e in events if e.get('cat') == 'job']
+        self.assertEqual(
+            sorted(e['name'] for e in job_events), ['a', 'a/b'])
+        subprocess_events = [
+            e for e in events if e.get('cat') == 'subprocess']
+        self.assertEqual(len(subprocess_events), 2)
+        # each subprocess is nested within the span of its job
+        for job_event in job_events:
+            subprocess_event = [
+                e for e in subprocess_events
+                if e['args']['path'] == job_event['name']][0]
+            self.assertEqual(subprocess_event['tid'], job_event['tid'])
+            self.assertGreaterEqual(subprocess_event['ts'], job_event['ts'])
+
+        # the nested job waited for the other job to finish
+        waits = [
+            e for e in events if e.get('cat') == 'wait' and e['ph'] == 'b']
+        self.assertEqual(
+            [e['args']['path'] for e in waits
+             if e['name'] == 'waiting for dependencies'], ['a/b'])
+
+
+class TestOrderedOutput(unittest.TestCase):
+
+    def test_order(self):
+        jobs = [create_job(path) for path in ('c', 'a', 'b')]
+        output = []
+        ordered_output = OrderedOutput(
+            jobs, output_handler=lambda r, hide_empty: output.append(
+                r['client'].path))
+
+        def result(job, returncode=0):
+            return {'client': job['client'], 'returncode': returncode}
+
+        ordered_output(result(jobs[0]))
+        self.assertEqual(output, [])
+        ordered_output(result(jobs[2], returncode=1))
+        self.assertEqual(output, [])
+        ordered_output(result(jobs[1]))
+        self.assertEqual(output, ['a', 'b', 'c'])
+        self.assertTrue(ordered_output.any_error)
+
+
+class TestLiveOutput(unittest.TestCase):
+
+    def test_lines(self):
+        command = LiveCommand(
+            'import sys; print(sys.argv[1]); print("done"); '
+            'sys.exit(sys.argv[1] == "b")')
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('a', 'b')]
+        previous_stdout = streams.stdout
+        stdout = StringIO()
+        set_streams(stdout=stdout)
+        try:
+            live_output = LiveOutput()
+            execute_jobs(
+                jobs, number_of_workers=2, live_output=True,
+                result_handler=live_output)
+        finally:
+            set_streams(stdout=previous_stdout)
+        # the lines of the jobs are interleaved but each one is in order
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(
+            [line for line in lines if line.startswith('a: ')],
+            ['a: a', 'a: done'])
+        self.assertEqual(
+            [line for line in lines if line.startswith('b: ')],
+            ['b: b', 'b: done', 'b: Failed with return code 1'])
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(live_output.any_error)
+
+
+class TestSubprocessRunner(unittest.TestCase):
+
+    def test_long_line(self):
+        # a line exceeding the buffer limit of the asyncio stream reader
+        cmd = [
+            sys.executable, '-c',
+            'print("x" * 200000); print("done", end="")']
+        loop = SubprocessLoop(1)
+        loop.start()
+        try:
+            for runner in (vcs_base._run_subprocess, loop.run_subprocess):
+                lines = []
+                output, returncode = runner(
+                    cmd, os.curdir, None, line_handler=lines.append)
+                self.assertEqual(returncode, 0)
+                self.assertEqual(output, b'x' * 200000 + b'\ndone')
+                self.assertEqual(lines, [b'x' * 200000 + b'\n', b'done'])
+        finally:
+            loop.stop()
+
+
+class TestNdjsonOutput(unittest.TestCase):
+
+    def test_lines(self):
+        command = EchoCommand()
+        jobs = [
+            {'client': Client(path), 'command': command}
+            for path in ('a', 'b')]
+        previous_stdout = streams.stdout
+        stdout = StringIO()
+        set_streams(stdout=stdout)
+        try:
+            ndjson_output = NdjsonOutput()
+            execute_jobs(jobs, result_handler=ndjson_output)
+        finally:
+            set_streams(stdout=previous_stdout)
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(len(lines), 2)
+        lines.sort(key=lambda line: line['path'])
+        self.assertEqual(lines[0]['path'], 'a')
+        self.assertEqual(lines[0]['client'], 'dummy')
+        self.assertEqual(lines[0]['command'], 'echo')
+        self.assertEqual(lines[0]['returncode'], 0)
+        self.assertEqual(lines[1]['output'], 'b')
+        self.assertGreaterEqual(lines[1]['duration'], 0)
+        self.assertFalse(ndjson_output.any_error)
+
+    def test_repositories(self):
+        # stdout only contains the JSON objects
+        previous_streams = streams.stdout, streams.stderr
+        stdout, stderr = StringIO(), StringIO()
+        set_streams(stdout=stdout, stderr=stderr)
+        try:
+            output_repositories([Client('b'), Client('a')], format_='ndjson')
+        finally:
+            set_streams(*previous_streams)
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertEqual(
+            stderr.getvalue().splitlines(), ['a (dummy)', 'b (dummy)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# the modules which aren't needed to run e.g. 'vcs status' in a repository
+# which isn't using any of these clients
+UNEXPECTED_MODULES = [
+    'multiprocessing',
+    'pkg_resources',
+    'socket',
+    'urllib.request',
+    'vcstool.clients.bzr',
+    'vcstool.clients.hg',
+    'vcstool.clients.svn',
+    'vcstool.clients.tar',
+    'vcstool.clients.zip',
+    'vcstool.daemon',
+    'yaml',
+]
+
+# upper bound for importing the entry point of 'vcs' relative to the modules
+# imported by the interpreter on startup, which scales the budget with the
+# speed of the machine, eagerly importing e.g. yaml and urllib exceeds it
+IMPORT_TIME_FACTOR = 8.0
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        output = run_python(
+            'import sys\n'
+            'from vcstool.commands.vcs import main\n'
+            'from vcstool.commands.status import main\n'
+            'print("\\n".join(sorted(sys.modules)))\n')
+        modules = output.splitlines()
+        for module in UNEXPECTED_MODULES:
+            self.assertNotIn(module, modules)
+
+    @unittest.skipIf(
+        sys.version_info < (3, 7), '-X importtime requires Python 3.7')
+    def test_budget(self):
+        # the fastest of a few runs to be robust against a busy machine
+        startup = min(
+            get_import_time('pass', None) for _ in range(3))
+        duration = min(
+            get_import_time(
+                'from vcstool.commands.vcs import main',
+                'vcstool.commands.vcs')
+            for _ in range(3))
+        self.assertLess(duration, startup * IMPORT_TIME_FACTOR)
+
+
+def get_import_time(code, module):
+    # the cumulative import time of the module, or of all modules imported
+    # by the interpreter itself if None, in microseconds
+    output = run_python(code, ['-X', 'importtime'])
+    rows = [
+        line[len('import time:'):].split('|') for line in output.splitlines()
+        if line.startswith('import time:')]
+    # skip the header
+    rows = [row for row in rows if row[1].strip().isdigit()]
+    if module is None:
+        return sum(int(row[0]) for row in rows)
+    durations = [int(row[1]) for row in rows if row[2].strip() == module]
+    assert len(durations) == 1
+    return durations[0]
+
+
+def run_python(code, options=None):
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = repo_root + os.pathsep + env.get('PYTHONPATH', '')
+    return subprocess.check_output(
+        [sys.executable] + (options or []) + ['-c', code],
+        stderr=subprocess.STDOUT, env=env, universal_newlines=True)
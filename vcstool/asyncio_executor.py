@@ -0,0 +1,133 @@
+import asyncio
+import subprocess
+import sys
+import threading
+
+from vcstool.clients.vcs_base import CommandCancelled
+from vcstool.clients.vcs_base import get_process_group_options
+from vcstool.clients.vcs_base import kill_process
+from vcstool.clients.vcs_base import register_process
+from vcstool.clients.vcs_base import unregister_process
+
+
+class SubprocessLoop(object):
+
+    def __init__(self, max_processes):
+        self.max_processes = max_processes
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._child_watcher = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop)
+        self._thread.daemon = True
+
+    def start(self):
+        if sys.version_info < (3, 8):
+            # before Python 3.8 the child watcher is notified by a SIGCHLD
+            # handler which can only be added from the main thread
+            if threading.current_thread() is not threading.main_thread():
+                raise RuntimeError(
+                    'The asyncio executor requires Python 3.8 or newer when '
+                    'not being invoked from the main thread')
+            self._child_watcher = asyncio.get_child_watcher()
+            self._child_watcher.attach_loop(self._loop)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        if self._child_watcher is not None:
+            self._child_watcher.attach_loop(None)
+        self._loop.close()
+
+    def run_subprocess(
+        self, cmd, cwd, env, line_handler=None, timeout=None, isolate=False
+    ):
+        # invoked from the worker threads, the calling thread only waits
+        # while all subprocesses are spawned and read by the event loop
+        future = asyncio.run_coroutine_threadsafe(
+            self._run_subprocess(
+                cmd, cwd, env, line_handler, timeout, isolate),
+            self._loop)
+        return future.result()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_processes)
+        self._loop.call_soon(self._started.set)
+        self._loop.run_forever()
+
+    async def _run_subprocess(
+        self, cmd, cwd, env, line_handler, timeout, isolate
+    ):
+        async with self._semaphore:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, cwd=cwd, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT, env=env,
+                **get_process_group_options(isolate))
+            kill_reasons = []
+
+            def kill(reason):
+                kill_reasons.append(reason)
+                kill_process(proc, tree=isolate)
+
+            def kill_threadsafe(reason):
+                # cancelling is triggered from a different thread
+                self._loop.call_soon_threadsafe(kill, reason)
+
+            timer = None
+            if timeout is not None:
+                timer = self._loop.call_later(timeout, kill, 'timeout')
+            register_process(kill_threadsafe)
+            try:
+                if line_handler is None:
+                    output, _ = await proc.communicate()
+                else:
+                    output = await _read_lines(proc.stdout, line_handler)
+                    await proc.wait()
+            except BaseException:
+                # don't leave the process behind when reading its output
+                # fails or the coroutine is cancelled
+                kill_process(proc, tree=isolate)
+                await proc.wait()
+                raise
+            finally:
+                unregister_process(kill_threadsafe)
+                if timer is not None:
+                    timer.cancel()
+            if kill_reasons:
+                if kill_reasons[0] == 'timeout':
+                    raise subprocess.TimeoutExpired(
+                        cmd, timeout, output=output)
+                raise CommandCancelled(output=output)
+            return output, proc.returncode
+
+
+# the size of the chunks read from the output, the lines are split here since
+# the stream reader fails to read a line exceeding its buffer limit
+READ_CHUNK_SIZE = 65536
+
+
+async def _read_lines(stream, line_handler):
+    chunks = []
+    partial = []
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        start = 0
+        while True:
+            end = chunk.find(b'\n', start) + 1
+            if not end:
+                break
+            partial.append(chunk[start:end])
+            line_handler(b''.join(partial))
+            partial = []
+            start = end
+        if start < len(chunk):
+            partial.append(chunk[start:])
+    if partial:
+        line_handler(b''.join(partial))
+    return b''.join(chunks)
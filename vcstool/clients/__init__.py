@@ -1,43 +1,109 @@
-vcstool_clients = []
-
-try:
-    from .bzr import BzrClient
-    vcstool_clients.append(BzrClient)
-except ImportError:
-    pass
-
-try:
-    from .git import GitClient
-    vcstool_clients.append(GitClient)
-except ImportError:
-    pass
-
-try:
-    from .hg import HgClient
-    vcstool_clients.append(HgClient)
-except ImportError:
-    pass
-
-try:
-    from .svn import SvnClient
-    vcstool_clients.append(SvnClient)
-except ImportError:
-    pass
-
-try:
-    from .tar import TarClient
-    vcstool_clients.append(TarClient)
-except ImportError:
-    pass
-
-try:
-    from .zip import ZipClient
-    vcstool_clients.append(ZipClient)
-except ImportError:
-    pass
-
-_client_types = [c.type for c in vcstool_clients]
+from collections.abc import MutableSequence
+import importlib
+import threading
+
+
+class _LazyClient(object):
+
+    # a client which module is only imported when it is being used, the type
+    # and the metadata directory need to match the attributes of the class
+    def __init__(self, type_, metadata_directory, module, name):
+        self.type = type_
+        self.metadata_directory = metadata_directory
+        self.module = module
+        self.name = name
+
+    @staticmethod
+    def is_repository(path):
+        # clients without a metadata directory, e.g. for archives, can't be
+        # detected in an existing directory
+        return False
+
+    def load(self):
+        try:
+            module = importlib.import_module(self.module)
+        except ImportError:
+            return None
+        return getattr(module, self.name)
+
+
+class _ClientRegistry(MutableSequence):
+
+    def __init__(self, clients):
+        # either client classes or lazy clients
+        self._clients = list(clients)
+        self._lock = threading.Lock()
+
+    def get_types(self):
+        return [client.type for client in self._clients]
+
+    def get_clients(self):
+        # the client classes or lazy clients without importing any module
+        return list(self._clients)
+
+    def get_class(self, type_):
+        with self._lock:
+            for i, client in enumerate(self._clients):
+                if client.type != type_:
+                    continue
+                if isinstance(client, _LazyClient):
+                    client = client.load()
+                    if client is None:
+                        del self._clients[i]
+                        return None
+                    self._clients[i] = client
+                return client
+        return None
+
+    def _load(self):
+        with self._lock:
+            clients = []
+            for client in self._clients:
+                if isinstance(client, _LazyClient):
+                    client = client.load()
+                    if client is None:
+                        continue
+                clients.append(client)
+            self._clients = clients
+            return clients
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __setitem__(self, index, value):
+        self._load()[index] = value
+
+    def __delitem__(self, index):
+        del self._load()[index]
+
+    def __len__(self):
+        return len(self._load())
+
+    def insert(self, index, value):
+        self._load().insert(index, value)
+
+
+# iterating over the clients imports all of them, use the functions below to
+# only import the modules of the clients being used
+vcstool_clients = _ClientRegistry([
+    _LazyClient('bzr', '.bzr', 'vcstool.clients.bzr', 'BzrClient'),
+    _LazyClient('git', '.git', 'vcstool.clients.git', 'GitClient'),
+    _LazyClient('hg', '.hg', 'vcstool.clients.hg', 'HgClient'),
+    _LazyClient('svn', '.svn', 'vcstool.clients.svn', 'SvnClient'),
+    _LazyClient('tar', None, 'vcstool.clients.tar', 'TarClient'),
+    _LazyClient('zip', None, 'vcstool.clients.zip', 'ZipClient'),
+])
+
+_client_types = vcstool_clients.get_types()
 if len(_client_types) != len(set(_client_types)):
     raise RuntimeError(
         'Multiple vcs clients share the same type: ' +
         ', '.join(sorted(_client_types)))
+
+
+def get_client_types():
+    return vcstool_clients.get_types()
+
+
+def get_client_class(type_):
+    return vcstool_clients.get_class(type_)
@@ -9,6 +9,7 @@ from ..util import rmtree
 class BzrClient(VcsClientBase):
 
     type = 'bzr'
+    metadata_directory = '.bzr'
     _executable = None
 
     @staticmethod
@@ -18,6 +19,21 @@ class BzrClient(VcsClientBase):
     def __init__(self, path):
         super(BzrClient, self).__init__(path)
 
+    def get_remote_url(self):
+        # read the parent location from the config file of the branch
+        try:
+            with open(
+                os.path.join(self.path, '.bzr', 'branch', 'branch.conf'),
+                'r', encoding='utf-8', errors='replace'
+            ) as h:
+                for line in h:
+                    key, sep, value = line.partition('=')
+                    if sep and key.strip() == 'parent_location':
+                        return value.strip()
+        except OSError:
+            pass
+        return None
+
     def branch(self, command):
         if command.all:
             return self._not_applicable(
@@ -30,12 +46,12 @@ class BzrClient(VcsClientBase):
     def custom(self, command):
         self._check_executable()
         cmd = [BzrClient._executable] + command.args
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def diff(self, _command):
         self._check_executable()
         cmd = [BzrClient._executable, 'diff']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def import_(self, command):
         if not command.url:
@@ -75,14 +91,15 @@ class BzrClient(VcsClientBase):
         if BzrClient.is_repository(self.path):
             # pull updates for existing repo
             cmd_pull = [BzrClient._executable, 'pull']
-            return self._run_command(cmd_pull, retry=command.retry)
+            return self._run_command(cmd_pull, retry=command.retry, live=True)
 
         else:
             cmd_branch = [BzrClient._executable, 'branch']
             if command.version:
                 cmd_branch += ['-r', command.version]
             cmd_branch += [command.url, '.']
-            result_branch = self._run_command(cmd_branch, retry=command.retry)
+            result_branch = self._run_command(
+                cmd_branch, retry=command.retry, live=True)
             if result_branch['returncode']:
                 result_branch['output'] = \
                     "Could not branch repository '%s': %s" % \
@@ -147,22 +164,22 @@ class BzrClient(VcsClientBase):
                 }
             if command.limit != 0:
                 cmd_log += ['--limit', '%d' % command.limit]
-            result_log = self._run_command(cmd_log)
+            result_log = self._run_command(cmd_log, live=True)
             return result_log
         cmd = [BzrClient._executable, 'log']
         if command.limit != 0:
             cmd += ['--limit', '%d' % command.limit]
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def pull(self, _command):
         self._check_executable()
         cmd = [BzrClient._executable, 'pull']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def push(self, _command):
         self._check_executable()
         cmd = [BzrClient._executable, 'push']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def remotes(self, _command):
         self._check_executable()
@@ -171,7 +188,7 @@ class BzrClient(VcsClientBase):
     def status(self, _command):
         self._check_executable()
         cmd = [BzrClient._executable, 'status']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def _get_parent_branch(self):
         cmd = [BzrClient._executable, 'info']
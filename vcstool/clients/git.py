@@ -1,8 +1,9 @@
 import os
+import re
 from shutil import which
 import subprocess
 
-from vcstool.executor import USE_COLOR
+from vcstool.executor import use_color
 
 from .vcs_base import VcsClientBase
 from ..util import rmtree
@@ -11,6 +12,7 @@ from ..util import rmtree
 class GitClient(VcsClientBase):
 
     type = 'git'
+    metadata_directory = '.git'
     _executable = None
     _git_version = None
     _config_color_is_auto = None
@@ -33,10 +35,33 @@ class GitClient(VcsClientBase):
     def __init__(self, path):
         super(GitClient, self).__init__(path)
 
+    def get_remote_url(self):
+        # read the config file directly, prefer the remote named 'origin'
+        urls = {}
+        remote = None
+        try:
+            with open(
+                os.path.join(self.path, '.git', 'config'), 'r',
+                encoding='utf-8', errors='replace'
+            ) as h:
+                for line in h:
+                    line = line.strip()
+                    if line.startswith('['):
+                        match = re.match(r'\[remote\s+"(.+)"\]', line)
+                        remote = match.group(1) if match else None
+                        continue
+                    key, sep, value = line.partition('=')
+                    if remote and sep and key.strip() == 'url':
+                        urls.setdefault(remote, value.strip())
+        except OSError:
+            return None
+        return urls.get('origin') or next(iter(urls.values()), None)
+
     def branch(self, command):
         self._check_executable()
         cmd = [GitClient._executable, 'branch']
-        result = self._run_command(cmd)
+        # only the output listing all branches is the result as is
+        result = self._run_command(cmd, live=command.all)
 
         if not command.all and not result['returncode']:
             # only show current branch
@@ -49,7 +74,7 @@ class GitClient(VcsClientBase):
     def custom(self, command):
         self._check_executable()
         cmd = [GitClient._executable] + command.args
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def diff(self, command):
         self._check_executable()
@@ -57,7 +82,7 @@ class GitClient(VcsClientBase):
         self._check_color(cmd)
         if command.context:
             cmd += ['--unified=%d' % command.context]
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def export(self, command):
         self._check_executable()
@@ -334,7 +359,8 @@ class GitClient(VcsClientBase):
                 cmd_fetch += ['--depth', '1']
             else:
                 version_type = None
-            result_fetch = self._run_command(cmd_fetch, retry=command.retry)
+            result_fetch = self._run_command(
+                cmd_fetch, retry=command.retry, live=True)
             if result_fetch['returncode']:
                 return result_fetch
             cmd = result_fetch['cmd']
@@ -365,7 +391,7 @@ class GitClient(VcsClientBase):
                     cmd_branch = [
                         GitClient._executable, 'branch', version_name,
                         '%s/%s' % (remote, version_name)]
-                    result_branch = self._run_command(cmd_branch)
+                    result_branch = self._run_command(cmd_branch, live=True)
                     if result_branch['returncode']:
                         result_branch['output'] = \
                             "Could not create branch '%s': %s" % \
@@ -394,7 +420,7 @@ class GitClient(VcsClientBase):
                 if command.shallow:
                     cmd_clone += ['--depth', '1']
                 result_clone = self._run_command(
-                    cmd_clone, retry=command.retry)
+                    cmd_clone, retry=command.retry, live=True)
                 if result_clone['returncode']:
                     result_clone['output'] = \
                         "Could not clone repository '%s': %s" % \
@@ -405,7 +431,7 @@ class GitClient(VcsClientBase):
             else:
                 # getting a hash or tag with a depth of 1 can't use 'clone'
                 cmd_init = [GitClient._executable, 'init']
-                result_init = self._run_command(cmd_init)
+                result_init = self._run_command(cmd_init, live=True)
                 if result_init['returncode']:
                     return result_init
                 cmd = result_init['cmd']
@@ -414,7 +440,8 @@ class GitClient(VcsClientBase):
                 cmd_remote_add = [
                     GitClient._executable, 'remote', 'add', 'origin',
                     command.url]
-                result_remote_add = self._run_command(cmd_remote_add)
+                result_remote_add = self._run_command(
+                    cmd_remote_add, live=True)
                 if result_remote_add['returncode']:
                     return result_remote_add
                 cmd += ' && ' + ' '.join(cmd_remote_add)
@@ -431,7 +458,7 @@ class GitClient(VcsClientBase):
                     assert False
                 cmd_fetch += ['--depth', '1']
                 result_fetch = self._run_command(
-                    cmd_fetch, retry=command.retry)
+                    cmd_fetch, retry=command.retry, live=True)
                 if result_fetch['returncode']:
                     return result_fetch
                 cmd += ' && ' + ' '.join(cmd_fetch)
@@ -442,11 +469,12 @@ class GitClient(VcsClientBase):
         if checkout_version:
             cmd_checkout = [
                 GitClient._executable, 'checkout', checkout_version, '--']
-            result_checkout = self._run_command(cmd_checkout)
+            result_checkout = self._run_command(cmd_checkout, live=True)
             if result_checkout['returncode']:
                 if self.get_git_version() < [1, 8, 4, 3]:
                     cmd_checkout.pop()
-                    result_checkout = self._run_command(cmd_checkout)
+                    result_checkout = self._run_command(
+                        cmd_checkout, live=True)
             if result_checkout['returncode']:
                 result_checkout['output'] = \
                     "Could not checkout ref '%s': %s" % \
@@ -459,7 +487,7 @@ class GitClient(VcsClientBase):
             cmd_submodule = [
                 GitClient._executable, 'submodule', 'update', '--init',
                 '--recursive']
-            result_submodule = self._run_command(cmd_submodule)
+            result_submodule = self._run_command(cmd_submodule, live=True)
             if result_submodule['returncode']:
                 result_submodule['output'] = \
                     'Could not init/update submodules: %s' % \
@@ -581,13 +609,13 @@ class GitClient(VcsClientBase):
         if not command.verbose:
             cmd += ['--pretty=short']
         self._check_color(cmd)
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def pull(self, _command):
         self._check_executable()
         cmd = [GitClient._executable, 'pull']
         self._check_color(cmd)
-        result = self._run_command(cmd)
+        result = self._run_command(cmd, live=True)
 
         if result['returncode']:
             # check for detached HEAD
@@ -614,12 +642,12 @@ class GitClient(VcsClientBase):
     def push(self, _command):
         self._check_executable()
         cmd = [GitClient._executable, 'push']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def remotes(self, _command):
         self._check_executable()
         cmd = [GitClient._executable, 'remote', '-v']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def status(self, command):
         self._check_executable()
@@ -647,7 +675,7 @@ class GitClient(VcsClientBase):
         self._check_color(cmd)
         if command.quiet:
             cmd += ['--untracked-files=no']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def validate(self, command):
         if not command.url:
@@ -755,7 +783,7 @@ class GitClient(VcsClientBase):
         }
 
     def _check_color(self, cmd):
-        if not USE_COLOR:
+        if not use_color():
             return
         # check if user uses colorization
         if GitClient._config_color_is_auto is None:
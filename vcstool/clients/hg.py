@@ -2,7 +2,7 @@ import os
 from shutil import which
 from threading import Lock
 
-from vcstool.executor import USE_COLOR
+from vcstool.executor import use_color
 
 from .vcs_base import VcsClientBase
 from ..util import rmtree
@@ -11,6 +11,7 @@ from ..util import rmtree
 class HgClient(VcsClientBase):
 
     type = 'hg'
+    metadata_directory = '.hg'
     _executable = None
     _config_color = None
     _config_color_lock = Lock()
@@ -22,16 +23,28 @@ class HgClient(VcsClientBase):
     def __init__(self, path):
         super(HgClient, self).__init__(path)
 
+    def get_remote_url(self):
+        # read the default path from the config file of the repository
+        from configparser import ConfigParser
+        from configparser import Error
+        config = ConfigParser(interpolation=None, strict=False)
+        try:
+            config.read(
+                os.path.join(self.path, '.hg', 'hgrc'), encoding='utf-8')
+        except (Error, UnicodeDecodeError):
+            return None
+        return config.get('paths', 'default', fallback=None)
+
     def branch(self, command):
         self._check_executable()
         cmd = [HgClient._executable, 'branches' if command.all else 'branch']
         self._check_color(cmd)
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def custom(self, command):
         self._check_executable()
         cmd = [HgClient._executable] + command.args
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def diff(self, command):
         self._check_executable()
@@ -39,7 +52,7 @@ class HgClient(VcsClientBase):
         self._check_color(cmd)
         if command.context:
             cmd += ['--unified %d' % command.context]
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def export(self, command):
         self._check_executable()
@@ -139,7 +152,8 @@ class HgClient(VcsClientBase):
             # pull updates for existing repo
             cmd_pull = [
                 HgClient._executable, '--noninteractive', 'pull', '--update']
-            result_pull = self._run_command(cmd_pull, retry=command.retry)
+            result_pull = self._run_command(
+                cmd_pull, retry=command.retry, live=True)
             if result_pull['returncode']:
                 return result_pull
             cmd = result_pull['cmd']
@@ -149,7 +163,8 @@ class HgClient(VcsClientBase):
             cmd_clone = [
                 HgClient._executable, '--noninteractive', 'clone', command.url,
                 '.']
-            result_clone = self._run_command(cmd_clone, retry=command.retry)
+            result_clone = self._run_command(
+                cmd_clone, retry=command.retry, live=True)
             if result_clone['returncode']:
                 result_clone['output'] = \
                     "Could not clone repository '%s': %s" % \
@@ -162,7 +177,7 @@ class HgClient(VcsClientBase):
             cmd_checkout = [
                 HgClient._executable, '--noninteractive', 'checkout',
                 command.version]
-            result_checkout = self._run_command(cmd_checkout)
+            result_checkout = self._run_command(cmd_checkout, live=True)
             if result_checkout['returncode']:
                 result_checkout['output'] = \
                     "Could not checkout '%s': %s" % \
@@ -218,23 +233,23 @@ class HgClient(VcsClientBase):
         if command.verbose:
             cmd += ['--verbose']
         self._check_color(cmd)
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def pull(self, _command):
         self._check_executable()
         cmd = [HgClient._executable, '--noninteractive', 'pull', '--update']
         self._check_color(cmd)
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def push(self, _command):
         self._check_executable()
         cmd = [HgClient._executable, '--noninteractive', 'push']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def remotes(self, _command):
         self._check_executable()
         cmd = [HgClient._executable, 'paths']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def status(self, command):
         self._check_executable()
@@ -242,7 +257,7 @@ class HgClient(VcsClientBase):
         self._check_color(cmd)
         if command.quiet:
             cmd += ['--untracked-files=no']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def validate(self, command):
         if not command.url:
@@ -297,7 +312,7 @@ class HgClient(VcsClientBase):
         }
 
     def _check_color(self, cmd):
-        if not USE_COLOR:
+        if not use_color():
             return
         with HgClient._config_color_lock:
             # check if user uses colorization
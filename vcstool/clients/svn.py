@@ -8,6 +8,7 @@ from .vcs_base import VcsClientBase
 class SvnClient(VcsClientBase):
 
     type = 'svn'
+    metadata_directory = '.svn'
     _executable = None
 
     @staticmethod
@@ -66,14 +67,14 @@ class SvnClient(VcsClientBase):
     def custom(self, command):
         self._check_executable()
         cmd = [SvnClient._executable] + command.args
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def diff(self, command):
         self._check_executable()
         cmd = [SvnClient._executable, 'diff']
         if command.context:
             cmd += ['--unified=%d' % command.context]
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def export(self, command):
         self._check_executable()
@@ -130,7 +131,8 @@ class SvnClient(VcsClientBase):
 
         cmd_checkout = [
             SvnClient._executable, '--non-interactive', 'checkout', url, '.']
-        result_checkout = self._run_command(cmd_checkout, retry=command.retry)
+        result_checkout = self._run_command(
+            cmd_checkout, retry=command.retry, live=True)
         if result_checkout['returncode']:
             result_checkout['output'] = \
                 "Could not checkout repository '%s': %s" % \
@@ -163,12 +165,12 @@ class SvnClient(VcsClientBase):
         cmd = [SvnClient._executable, 'log']
         if command.limit != 0:
             cmd += ['--limit', '%d' % command.limit]
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def pull(self, _command):
         self._check_executable()
         cmd = [SvnClient._executable, '--non-interactive', 'update']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def push(self, command):
         self._check_executable()
@@ -208,7 +210,7 @@ class SvnClient(VcsClientBase):
         cmd = [SvnClient._executable, 'status']
         if command.quiet:
             cmd += ['--quiet']
-        return self._run_command(cmd)
+        return self._run_command(cmd, live=True)
 
     def validate(self, command):
         if not command.url:
@@ -1,16 +1,25 @@
 import os
-import socket
+import signal
 import subprocess
+import sys
+import threading
 import time
-from urllib.error import HTTPError
-from urllib.error import URLError
-from urllib.request import Request
-from urllib.request import urlopen
+
+from vcstool.retry import classify_failure
+from vcstool.retry import classify_url_error
+from vcstool.retry import get_retry_policy
+from vcstool.retry import PERMANENT
 
 
 class VcsClientBase(object):
 
     type = None
+    # the name of the directory identifying a repository, allows to detect
+    # the type of a repository from the directory listing
+    metadata_directory = None
+    # the identity of the directory if known from crawling, allows to detect
+    # the same repository reached through different paths
+    directory_key = None
 
     def __init__(self, path):
         self.path = path
@@ -23,6 +32,11 @@ class VcsClientBase(object):
                 pass
         return super(VcsClientBase, self).__getattribute__(name)
 
+    def get_remote_url(self):
+        # the URL of the default remote if it can be determined cheaply
+        # without invoking the vcs executable, otherwise None
+        return None
+
     def _not_applicable(self, command, message=None):
         return {
             'cmd': '%s.%s(%s)' % (
@@ -33,17 +47,29 @@ class VcsClientBase(object):
             'returncode': NotImplemented
         }
 
-    def _run_command(self, cmd, env=None, retry=0):
+    def _run_command(self, cmd, env=None, retry=0, live=False):
+        # only the output of live commands is passed to the output line
+        # handler, it should be set for the commands whose output becomes the
+        # result of the job but not for e.g. probing the configuration
+        retry_policy = get_retry_policy()
         for i in range(retry + 1):
-            result = run_command(cmd, os.path.abspath(self.path), env=env)
+            result = run_command(
+                cmd, os.path.abspath(self.path), env=env, live=live)
             if not result['returncode']:
                 # return successful result
                 break
-            if i >= retry:
+            if i >= retry or result.get('timed_out') or \
+                    result.get('cancelled'):
                 # return the failure after retries
                 break
-            # increasing sleep before each retry
-            time.sleep(i + 1)
+            retry_condition = getattr(_thread_local, 'retry_condition', None)
+            if retry_condition is not None and not retry_condition():
+                break
+            if not retry_policy.should_retry(classify_failure(
+                result['output'], result['returncode']
+            )):
+                break
+            sleep_before_retry(retry_policy.get_delay(i))
         return result
 
     def _create_path(self):
@@ -61,63 +87,326 @@ class VcsClientBase(object):
         return None
 
 
-def run_command(cmd, cwd, env=None):
+# state specific to the thread invoking the commands, e.g. a worker
+_thread_local = threading.local()
+
+# the return code of commands which have been killed after timing out,
+# the same as the one used by the coreutils timeout command
+TIMEOUT_RETURNCODE = 124
+
+
+def set_subprocess_runner(runner):
+    # the runner is invoked with the command, working directory, environment,
+    # output line handler, timeout and whether to isolate the process in its
+    # own process group and returns the combined output and the return code,
+    # after killing the process it raises subprocess.TimeoutExpired or
+    # CommandCancelled, passing None restores the default runner using Popen
+    _thread_local.subprocess_runner = runner
+
+
+def set_output_line_handler(line_handler):
+    # the handler is invoked with each line of output as soon as it has been
+    # read from a subprocess invoked as a live command, passing None only
+    # collects the output
+    _thread_local.output_line_handler = line_handler
+
+
+def set_subprocess_records(records):
+    # each subprocess being run is appended to the list with its command,
+    # working directory, start time, duration and return code
+    _thread_local.subprocess_records = records
+
+
+def set_retry_condition(condition):
+    # the callable is invoked before retrying a failed command and returns
+    # whether retrying is still worthwhile, passing None always retries
+    _thread_local.retry_condition = condition
+
+
+def set_command_timeout(deadline=None, timeout=None):
+    # each subprocess is killed after running for the timeout in seconds or
+    # when reaching the deadline in terms of time.monotonic(), whichever is
+    # earlier, this also resets the flags whether any command has timed out
+    # or has been cancelled
+    _thread_local.deadline = deadline
+    _thread_local.timeout = timeout
+    _thread_local.timed_out = False
+    _thread_local.cancelled = False
+
+
+def has_timed_out():
+    return getattr(_thread_local, 'timed_out', False)
+
+
+def has_been_cancelled():
+    return getattr(_thread_local, 'cancelled', False)
+
+
+def _get_timeout():
+    timeout = getattr(_thread_local, 'timeout', None)
+    deadline = getattr(_thread_local, 'deadline', None)
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if timeout is None or remaining < timeout:
+            timeout = remaining
+    return timeout
+
+
+class CommandCancelled(Exception):
+
+    def __init__(self, output=None):
+        super(CommandCancelled, self).__init__()
+        self.output = output
+
+
+# state shared by all threads to cancel all running and future commands, the
+# lock is reentrant since the SIGINT handler cancels the commands on the main
+# thread which might already hold it
+_cancellation_lock = threading.RLock()
+_cancellation_reason = None
+_cancellation_event = threading.Event()
+_isolate_processes = False
+_always_isolate_processes = False
+_interactive_processes = False
+_running_processes = set()
+
+
+def reset_cancellation(isolate_processes=False, interactive=False):
+    # isolating every process in its own process group allows to kill the
+    # whole process tree when cancelling, otherwise only the process itself
+    # is terminated, interactive processes are never isolated since they
+    # might prompt on the terminal, e.g. ssh asking to confirm a fingerprint
+    global _cancellation_reason
+    global _isolate_processes
+    global _interactive_processes
+    with _cancellation_lock:
+        _cancellation_reason = None
+        _interactive_processes = interactive and not _always_isolate_processes
+        _isolate_processes = _always_isolate_processes or (
+            isolate_processes and not interactive)
+        _cancellation_event.clear()
+
+
+def set_always_isolate_processes(isolate):
+    # a long running process without a terminal, e.g. the daemon, isolates
+    # every process to be able to kill the whole process tree when a client
+    # disconnects
+    global _always_isolate_processes
+    _always_isolate_processes = isolate
+
+
+def cancel_commands(reason):
+    # subsequent commands aren't invoked anymore and all running processes
+    # are killed, the reason completes sentences like 'Cancelled since ...'
+    global _cancellation_reason
+    with _cancellation_lock:
+        if _cancellation_reason is not None:
+            return
+        _cancellation_reason = reason
+        _cancellation_event.set()
+        kills = list(_running_processes)
+    for kill in kills:
+        kill('cancelled')
+
+
+def get_cancellation_reason():
+    return _cancellation_reason
+
+
+def sleep_before_retry(delay):
+    # return early when the commands are being cancelled
+    _cancellation_event.wait(delay)
+
+
+def register_process(kill):
+    # the callable is invoked with the reason 'cancelled' when cancelling,
+    # it is invoked immediately if the commands have already been cancelled
+    with _cancellation_lock:
+        _running_processes.add(kill)
+        # the commands might have been cancelled while holding the lock
+        cancelled = _cancellation_reason is not None
+    if cancelled:
+        kill('cancelled')
+
+
+def unregister_process(kill):
+    with _cancellation_lock:
+        _running_processes.discard(kill)
+
+
+def run_command(cmd, cwd, env=None, live=False):
     if not os.path.exists(cwd):
         cwd = None
     result = {'cmd': ' '.join(cmd), 'cwd': cwd}
+    runner = getattr(_thread_local, 'subprocess_runner', None) or \
+        _run_subprocess
+    line_handler = getattr(_thread_local, 'output_line_handler', None) \
+        if live else None
+    if line_handler is not None:
+        # the output has been passed to the handler line by line
+        result['streamed'] = True
+    timeout = _get_timeout()
+    isolate = _isolate_processes or (
+        timeout is not None and not _interactive_processes)
+    start = time.time()
+    start_clock = time.monotonic()
     try:
-        proc = subprocess.Popen(
-            cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-            env=env)
-        output, _ = proc.communicate()
+        if _cancellation_reason is not None:
+            raise CommandCancelled()
+        if timeout is not None and timeout <= 0:
+            # the deadline has already been reached
+            raise subprocess.TimeoutExpired(cmd, 0)
+        output, returncode = runner(
+            cmd, cwd, env, line_handler, timeout, isolate)
         result['output'] = output.rstrip().decode('utf8')
-        result['returncode'] = proc.returncode
+        result['returncode'] = returncode
     except subprocess.CalledProcessError as e:
         result['output'] = e.output.decode('utf8')
         result['returncode'] = e.returncode
+    except subprocess.TimeoutExpired as e:
+        _thread_local.timed_out = True
+        output = (e.output or b'').rstrip().decode('utf8', 'replace')
+        result['output'] = (output + '\n' if output else '') + (
+            'Timed out after %.1f seconds' % e.timeout if e.timeout > 0
+            else 'Not invoked since the timeout has already been reached')
+        result['returncode'] = TIMEOUT_RETURNCODE
+        result['timed_out'] = True
+    except CommandCancelled as e:
+        _thread_local.cancelled = True
+        output = (e.output or b'').rstrip().decode('utf8', 'replace')
+        result['output'] = (output + '\n' if output else '') + (
+            'Cancelled since ' if e.output is not None
+            else 'Not invoked since ') + _cancellation_reason
+        result['returncode'] = 1
+        result['cancelled'] = True
+    records = getattr(_thread_local, 'subprocess_records', None)
+    if records is not None:
+        records.append({
+            'cmd': result['cmd'],
+            'cwd': cwd,
+            'start': start,
+            'duration': time.monotonic() - start_clock,
+            'returncode': result['returncode'],
+        })
     return result
 
 
-def load_url(url, retry=2, retry_period=1, timeout=10):
+def get_process_group_options(isolate):
+    # only a process which might be killed runs in a separate process group,
+    # otherwise e.g. ssh couldn't prompt for a passphrase on the terminal
+    if not isolate:
+        return {}
+    if sys.platform == 'win32':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def kill_process(proc, tree=False):
+    # when the process has been isolated kill it including all processes it
+    # has spawned, e.g. the remote helpers and ssh processes of git
+    try:
+        if not tree:
+            proc.terminate()
+        elif sys.platform == 'win32':
+            subprocess.call(
+                ['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _run_subprocess(
+    cmd, cwd, env, line_handler=None, timeout=None, isolate=False
+):
+    proc = subprocess.Popen(
+        cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        env=env, **get_process_group_options(isolate))
+    # reading the output blocks until all processes holding it are gone
+    kill_reasons = []
+
+    def kill(reason):
+        kill_reasons.append(reason)
+        kill_process(proc, tree=isolate)
+
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, kill, args=('timeout', ))
+        timer.daemon = True
+        timer.start()
+    register_process(kill)
     try:
-        fh = urlopen(url, timeout=timeout)
-    except HTTPError as e:
-        if e.code == 503 and retry:
-            time.sleep(retry_period)
-            return load_url(
-                url, retry=retry - 1, retry_period=retry_period,
-                timeout=timeout)
-        e.msg += ' (%s)' % url
-        raise
-    except URLError as e:
-        if isinstance(e.reason, socket.timeout) and retry:
-            time.sleep(retry_period)
-            return load_url(
-                url, retry=retry - 1, retry_period=retry_period,
-                timeout=timeout)
-        raise URLError(str(e) + ' (%s)' % url)
+        if line_handler is None:
+            output, _ = proc.communicate()
+        else:
+            lines = []
+            for line in iter(proc.stdout.readline, b''):
+                lines.append(line)
+                line_handler(line)
+            proc.stdout.close()
+            proc.wait()
+            output = b''.join(lines)
+    finally:
+        unregister_process(kill)
+        if timer is not None:
+            timer.cancel()
+    if kill_reasons:
+        if kill_reasons[0] == 'timeout':
+            raise subprocess.TimeoutExpired(cmd, timeout, output=output)
+        raise CommandCancelled(output=output)
+    return output, proc.returncode
+
+
+def load_url(url, retry=2, retry_period=1, timeout=10):
+    # urllib is only imported when needed since it is slow to import
+    from urllib.error import HTTPError
+    from urllib.error import URLError
+    from urllib.request import urlopen
+    retry_policy = get_retry_policy()
+    for i in range(retry + 1):
+        try:
+            fh = urlopen(url, timeout=timeout)
+            break
+        except HTTPError as e:
+            if not _should_retry_url(retry_policy, e, i, retry, retry_period):
+                e.msg += ' (%s)' % url
+                raise
+        except URLError as e:
+            if not _should_retry_url(retry_policy, e, i, retry, retry_period):
+                raise URLError(str(e) + ' (%s)' % url)
     return fh.read()
 
 
 def test_url(url, retry=2, retry_period=1, timeout=10):
+    from urllib.error import HTTPError
+    from urllib.error import URLError
+    from urllib.request import Request
+    from urllib.request import urlopen
     request = Request(url)
     request.get_method = lambda: 'HEAD'
 
-    try:
-        response = urlopen(request)
-    except HTTPError as e:
-        if e.code == 503 and retry:
-            time.sleep(retry_period)
-            return test_url(
-                url, retry=retry - 1, retry_period=retry_period,
-                timeout=timeout)
-        e.msg += ' (%s)' % url
-        raise
-    except URLError as e:
-        if isinstance(e.reason, socket.timeout) and retry:
-            time.sleep(retry_period)
-            return test_url(
-                url, retry=retry - 1, retry_period=retry_period,
-                timeout=timeout)
-        raise URLError(str(e) + ' (%s)' % url)
+    retry_policy = get_retry_policy()
+    for i in range(retry + 1):
+        try:
+            response = urlopen(request)
+            break
+        except HTTPError as e:
+            if not _should_retry_url(retry_policy, e, i, retry, retry_period):
+                e.msg += ' (%s)' % url
+                raise
+        except URLError as e:
+            if not _should_retry_url(retry_policy, e, i, retry, retry_period):
+                raise URLError(str(e) + ' (%s)' % url)
     return response
+
+
+def _should_retry_url(retry_policy, e, attempt, retry, retry_period):
+    # sleep before the next attempt if the error is known to be transient
+    if attempt >= retry or not retry_policy.should_retry(
+        classify_url_error(e) or PERMANENT
+    ):
+        return False
+    sleep_before_retry(
+        retry_policy.get_delay(attempt, base_delay=retry_period))
+    return True
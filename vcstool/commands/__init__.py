@@ -1,5 +1,6 @@
 from .branch import BranchCommand
 from .custom import CustomCommand
+from .daemon import DaemonCommand
 from .diff import DiffCommand
 from .export import ExportCommand
 from .import_ import ImportCommand
@@ -13,6 +14,7 @@ from .validate import ValidateCommand
 vcstool_commands = []
 vcstool_commands.append(BranchCommand)
 vcstool_commands.append(CustomCommand)
+vcstool_commands.append(DaemonCommand)
 vcstool_commands.append(DiffCommand)
 vcstool_commands.append(ExportCommand)
 vcstool_commands.append(ImportCommand)
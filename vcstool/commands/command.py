@@ -1,17 +1,39 @@
 import argparse
-from multiprocessing import cpu_count
 import os
+import sys
+import time
 
+from vcstool.concurrency import AdaptiveConcurrency
 from vcstool.crawler import find_repositories
+from vcstool.executor import ansi
+from vcstool.executor import ASYNCIO_MAX_PROCESSES
 from vcstool.executor import execute_jobs
+from vcstool.executor import EXECUTORS
+from vcstool.executor import FORMATS
 from vcstool.executor import generate_jobs
+from vcstool.executor import LiveOutput
+from vcstool.executor import NdjsonOutput
+from vcstool.executor import OrderedOutput
 from vcstool.executor import output_repositories
 from vcstool.executor import output_results
+from vcstool.history import DurationHistory
+from vcstool.hosts import assign_hosts
+from vcstool.hosts import CircuitBreaker
+from vcstool.hosts import get_host_limits
+from vcstool.hosts import host_limit
+from vcstool.index import get_shared_index
+from vcstool.index import RepositoryIndex
+from vcstool.retry import RetryPolicy
+from vcstool.retry import set_retry_policy
+from vcstool.timings import Timings
+from vcstool.trace_events import Trace
 
 
 class Command(object):
 
     command = None
+    # the jobs of commands requiring network access are limited per host
+    requires_network = False
 
     def __init__(self, args):
         self.debug = args.debug if 'debug' in args else False
@@ -24,6 +46,24 @@ class Command(object):
             self.paths = [args.path]
 
 
+class RepositoryCommand(object):
+
+    # a lightweight view of a command shared by all repositories which only
+    # stores the repository specific attributes
+    __slots__ = ('shared', 'url', 'version')
+
+    def __init__(self, shared, url, version=None):
+        self.shared = shared
+        self.url = url
+        self.version = version
+
+    def __getattr__(self, name):
+        # only invoked for the attributes which aren't repository specific
+        if name == 'shared':
+            raise AttributeError(name)
+        return getattr(self.shared, name)
+
+
 def check_greater_zero(value):
     try:
         value = int(value)
@@ -35,9 +75,58 @@ def check_greater_zero(value):
     return value
 
 
+def check_non_negative(value):
+    try:
+        value = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid int value: '%s'" % value)
+    if value < 0:
+        raise argparse.ArgumentTypeError(
+            "invalid non-negative int value: '%d'" % value)
+    return value
+
+
+def workers_type(value):
+    if value == 'auto':
+        return value
+    return check_greater_zero(value)
+
+
+def get_default_workers():
+    # unlike multiprocessing.cpu_count() this doesn't need to import the
+    # multiprocessing module
+    return os.cpu_count() or 4
+
+
+def get_concurrency(workers):
+    # return the number of worker threads and the adaptive concurrency
+    # controller if the number of workers should be determined automatically
+    if workers != 'auto':
+        return workers, None
+    initial = get_default_workers()
+    maximum = max(64, initial)
+    return maximum, AdaptiveConcurrency(initial, maximum)
+
+
+def check_positive_float(value):
+    try:
+        value = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid float value: '%s'" % value)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(
+            "invalid positive float value: '%s'" % value)
+    return value
+
+
+def deadline_in_seconds(value):
+    # the deadline is relative to when the arguments are being parsed
+    return time.monotonic() + check_positive_float(value)
+
+
 def add_common_arguments(
-    parser, skip_hide_empty=False, skip_nested=False, path_nargs='*',
-    path_help=None
+    parser, skip_hide_empty=False, skip_nested=False, skip_output_modes=False,
+    path_nargs='*', path_help=None
 ):
     parser.formatter_class = argparse.ArgumentDefaultsHelpFormatter
     group = parser.add_argument_group('Common parameters')
@@ -52,16 +141,116 @@ def add_common_arguments(
         group.add_argument(
             '-n', '--nested', action='store_true',
             default=False, help='Search for nested repositories')
-    try:
-        default_workers = cpu_count()
-    except NotImplementedError:
-        default_workers = 4
+        group.add_argument(
+            '--input', type=argparse.FileType('r'), metavar='FILE',
+            help='Operate on the repositories listed in a YAML file in the '
+                 'format used by import instead of searching for '
+                 'repositories (relative to the base path)')
+        group.add_argument(
+            '--exclude', action='append', metavar='PATTERN',
+            help='Skip directories matching the glob pattern when searching '
+                 'for repositories, a pattern containing a slash matches '
+                 'the path relative to the base path otherwise the name of '
+                 'a directory (can be passed multiple times, additional '
+                 "patterns are read from a '.vcsignore' file in the base "
+                 'path)')
+        group.add_argument(
+            '--max-depth', type=check_non_negative, metavar='N',
+            help='Maximum depth of directories below the base path to search '
+                 'for repositories')
+        group.add_argument(
+            '--reindex', action='store_true', default=False,
+            help='Search all directories for repositories instead of reusing '
+                 'the cached listings of unmodified directories')
+        group.add_argument(
+            '--no-index', action='store_true', default=False,
+            help='Neither use nor update the cached listings of the '
+                 'directories searched for repositories')
+    group.add_argument(
+        '-w', '--workers', type=workers_type, metavar='N',
+        help="Number of parallel worker threads, or 'auto' to adapt the "
+             'number continuously to the achieved throughput (if not given '
+             'the number of CPUs, with the asyncio executor the maximum '
+             'number of processes)')
+    group.add_argument(
+        '--max-per-host', type=host_limit, action='append',
+        metavar='[HOST=]N',
+        help='Maximum number of parallel jobs per remote host for commands '
+             'requiring network access (import, pull, push, validate), '
+             'either for all hosts or for a specific one (can be passed '
+             'multiple times)')
+    group.add_argument(
+        '--max-host-failures', type=check_greater_zero, metavar='K',
+        help='Fail the remaining jobs for a remote host immediately after K '
+             'consecutive jobs for that host failed to connect (for '
+             'commands requiring network access)')
     group.add_argument(
-        '-w', '--workers', type=check_greater_zero, metavar='N',
-        default=default_workers, help='Number of parallel worker threads')
+        '--retry-budget', type=check_non_negative, metavar='N',
+        help='Maximum number of retries of failed network operations in '
+             'total across all repositories')
+    group.add_argument(
+        '--executor', choices=EXECUTORS, default='threads',
+        help='How to run the subprocesses of the jobs, the asyncio executor '
+             'spawns and reads all of them from a single event loop')
+    group.add_argument(
+        '--max-processes', type=check_greater_zero, metavar='N',
+        default=ASYNCIO_MAX_PROCESSES,
+        help='Maximum number of jobs running their subprocesses '
+             'concurrently with the asyncio executor')
+    group.add_argument(
+        '--timeout', type=check_positive_float, metavar='SECONDS',
+        help='Kill the commands of a repository which takes longer and '
+             'report it as timed out')
+    group.add_argument(
+        '--subprocess-timeout', type=check_positive_float, metavar='SECONDS',
+        help='Kill each individual command which takes longer and report the '
+             'repository as timed out')
+    group.add_argument(
+        '--deadline', type=deadline_in_seconds, metavar='SECONDS',
+        help='Cancel all pending and running jobs after the time since the '
+             'invocation exceeds the deadline and output the partial '
+             'results')
+    group.add_argument(
+        '--fail-fast', action='store_true', default=False,
+        help='Cancel all pending and running jobs after the first failure')
+    output_group = group
+    if not skip_output_modes:
+        output_group = group.add_mutually_exclusive_group()
+        output_group.add_argument(
+            '--stream', action='store_true', default=False,
+            help='Output the results in alphabetic order while the jobs are '
+                 'running instead of after all jobs have finished (without '
+                 'the progress indicator)')
+        output_group.add_argument(
+            '--live', action='store_true', default=False,
+            help='Output each line as soon as a command outputs it, prefixed '
+                 'with the path of the repository')
+    output_group.add_argument(
+        '--format', choices=FORMATS, default='text',
+        help='The format of the results, ndjson outputs a JSON object per '
+             'line for each repository as soon as its job has finished')
     group.add_argument(
         '--repos', action='store_true', default=False,
         help='List repositories which the command operates on')
+    group.add_argument(
+        '--no-history', action='store_true', default=False,
+        help='Neither use nor record the durations of previous invocations '
+             'which are used to start the slowest repositories first')
+    group.add_argument(
+        '--timings', action='store_true', default=False,
+        help='Output the slowest repositories and subprocesses as well as '
+             'the total durations')
+    group.add_argument(
+        '--timings-top', type=check_greater_zero, metavar='N', default=10,
+        help='Number of the slowest repositories and subprocesses to output')
+    group.add_argument(
+        '--timings-file', metavar='FILE',
+        help='Write the timing of every repository and subprocess to a CSV '
+             'file (or a JSON file if the filename ends with .json)')
+    group.add_argument(
+        '--trace-file', metavar='FILE',
+        help='Write a timeline of all jobs and subprocesses per worker in '
+             'the Trace Event Format (e.g. for chrome://tracing or Perfetto)')
     if path_nargs == '?':
         path_help = path_help or 'Base path to look for repositories'
         group.add_argument(
@@ -88,15 +277,173 @@ def simple_main(parser, command_class, args=None):
     args = parser.parse_args(args)
 
     command = command_class(args)
-    clients = find_repositories(command.paths, nested=command.nested)
+    clients = find_command_repositories(command, args)
+    if clients is None:
+        return 1
     if command.output_repos:
-        output_repositories(clients)
+        output_repositories(clients, format_=args.format)
     jobs = generate_jobs(clients, command)
-    results = execute_jobs(
-        jobs, show_progress=True, number_of_workers=args.workers,
-        debug_jobs=args.debug)
+    return execute_and_output_jobs(jobs, args)
+
+
+def find_command_repositories(command, args):
+    if args.input:
+        try:
+            return get_input_repositories(command.paths, args.input)
+        except RuntimeError as e:
+            print(ansi('redf') + str(e) + ansi('reset'), file=sys.stderr)
+            return None
+
+    index = get_repository_index(args)
+    clients = find_repositories(
+        command.paths, nested=command.nested, index=index,
+        exclude=args.exclude, max_depth=args.max_depth)
+    if index is not None:
+        index.save()
+    return clients
+
+
+def get_input_repositories(paths, input_file):
+    # the repositories listed in the file are used as they are instead of
+    # searching the base paths for them
+    from vcstool.commands.import_ import create_client
+    from vcstool.commands.import_ import get_repositories
+    repos = get_repositories(input_file)
+    clients = []
+    for base_path in paths:
+        for path, repo in repos.items():
+            path = os.path.join(base_path, path)
+            if not os.path.isdir(path):
+                print(
+                    ansi('yellowf') + (
+                        "Skipping repository '%s' since the path doesn't "
+                        'exist' % path) + ansi('reset'),
+                    file=sys.stderr)
+                continue
+            client = create_client(path, repo['type'])
+            if client is None:
+                print(
+                    ansi('yellowf') + (
+                        "Skipping repository '%s' since the type '%s' is not "
+                        'supported' % (path, repo['type'])) + ansi('reset'),
+                    file=sys.stderr)
+                continue
+            clients.append(client)
+    return clients
+
+
+def get_repository_index(args):
+    if args.no_index:
+        return None
+    index = get_shared_index()
+    if index is not None:
+        if args.reindex:
+            index.clear()
+        return index
+    index = RepositoryIndex()
+    if not args.reindex:
+        index.load()
+    return index
+
+
+def get_result_observers(args):
+    observers = []
+    if args.timings or args.timings_file:
+        observers.append(Timings(
+            output=args.timings, top=args.timings_top,
+            path=args.timings_file))
+    if args.trace_file:
+        observers.append(Trace(args.trace_file))
+    return observers
+
+
+def finish_result_observers(observers):
+    for observer in observers:
+        observer.finish()
+
+
+def get_duration_history(args):
+    if args.no_history:
+        return None
+    duration_history = DurationHistory()
+    duration_history.load()
+    return duration_history
+
+
+def get_execute_jobs_kwargs(
+    jobs, args, number_of_workers=None, interactive=False
+):
+    # the keyword arguments of execute_jobs() derived from the common
+    # arguments, this also sets the retry policy and assigns the hosts to the
+    # jobs if necessary
+    set_retry_policy(RetryPolicy(budget=args.retry_budget))
+    host_limits = get_host_limits(args.max_per_host)
+    circuit_breaker = CircuitBreaker(args.max_host_failures) \
+        if args.max_host_failures else None
+    if host_limits or circuit_breaker:
+        assign_hosts(jobs)
+    workers = number_of_workers or args.workers
+    if workers is None:
+        # the asyncio executor doesn't need a thread per subprocess, unless
+        # given explicitly it runs as many jobs as processes are allowed
+        workers = args.max_processes if args.executor == 'asyncio' \
+            else get_default_workers()
+    number_of_workers, concurrency = get_concurrency(workers)
+    return {
+        'number_of_workers': number_of_workers,
+        'concurrency': concurrency,
+        'debug_jobs': args.debug,
+        'executor': args.executor,
+        'max_processes': args.max_processes,
+        'result_observers': get_result_observers(args),
+        'duration_history': get_duration_history(args),
+        'timeout': args.timeout,
+        'subprocess_timeout': args.subprocess_timeout,
+        'fail_fast': args.fail_fast,
+        'deadline': args.deadline,
+        'host_limits': host_limits,
+        'circuit_breaker': circuit_breaker,
+        'interactive': interactive,
+    }
+
+
+def finish_execute_jobs(kwargs):
+    # the counterpart of get_execute_jobs_kwargs() after executing the jobs
+    finish_result_observers(kwargs['result_observers'])
+    if kwargs['duration_history']:
+        kwargs['duration_history'].save()
+
+
+def execute_and_output_jobs(
+    jobs, args, number_of_workers=None, interactive=False
+):
+    hide_empty = args.hide_empty if 'hide_empty' in args else False
+    kwargs = get_execute_jobs_kwargs(
+        jobs, args, number_of_workers=number_of_workers,
+        interactive=interactive)
+
+    if args.format == 'ndjson':
+        ndjson_output = NdjsonOutput()
+        execute_jobs(jobs, result_handler=ndjson_output, **kwargs)
+        any_error = ndjson_output.any_error
+
+    elif args.live:
+        live_output = LiveOutput(hide_empty=hide_empty)
+        execute_jobs(
+            jobs, live_output=True, result_handler=live_output, **kwargs)
+        any_error = live_output.any_error
+
+    elif args.stream:
+        ordered_output = OrderedOutput(jobs, hide_empty=hide_empty)
+        execute_jobs(jobs, result_handler=ordered_output, **kwargs)
+        any_error = ordered_output.any_error
+
+    else:
+        results = execute_jobs(jobs, show_progress=True, **kwargs)
+
+        output_results(results, hide_empty=hide_empty)
 
-    output_results(results, hide_empty=args.hide_empty)
+        any_error = any(r['returncode'] for r in results)
 
-    any_error = any(r['returncode'] for r in results)
+    finish_execute_jobs(kwargs)
     return 1 if any_error else 0
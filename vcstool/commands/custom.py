@@ -1,16 +1,15 @@
 import argparse
 import sys
 
-from vcstool.clients import vcstool_clients
-from vcstool.crawler import find_repositories
-from vcstool.executor import execute_jobs
+from vcstool.clients import get_client_types
 from vcstool.executor import generate_jobs
 from vcstool.executor import output_repositories
-from vcstool.executor import output_results
 from vcstool.streams import set_streams
 
 from .command import add_common_arguments
 from .command import Command
+from .command import execute_and_output_jobs
+from .command import find_command_repositories
 
 
 class CustomCommand(Command):
@@ -28,9 +27,7 @@ def get_parser():
         description='Run a custom command', prog='vcs custom')
     group = parser.add_argument_group(
         '"custom" command parameters restricting the repositories')
-    for client_type in [
-        c.type for c in vcstool_clients if c.type not in ['tar']
-    ]:
+    for client_type in [t for t in get_client_types() if t not in ['tar']]:
         group.add_argument(
             '--' + client_type, action='store_true', default=False,
             help="Run command on '%s' repositories" % client_type)
@@ -63,33 +60,28 @@ def main(args=None, stdout=None, stderr=None):
 
     # check if any client type is specified
     any_client_type = False
-    for client in vcstool_clients:
-        if client.type in args and args.__dict__[client.type]:
+    for client_type in get_client_types():
+        if client_type in args and args.__dict__[client_type]:
             any_client_type = True
             break
     # if no client type is specified enable all client types
     if not any_client_type:
-        for client in vcstool_clients:
-            if client.type in args:
-                args.__dict__[client.type] = True
+        for client_type in get_client_types():
+            if client_type in args:
+                args.__dict__[client_type] = True
 
     command = CustomCommand(args)
 
     # filter repositories by specified client types
-    clients = find_repositories(command.paths, nested=command.nested)
+    clients = find_command_repositories(command, args)
+    if clients is None:
+        return 1
     clients = [c for c in clients if c.type in args and args.__dict__[c.type]]
 
     if command.output_repos:
-        output_repositories(clients)
+        output_repositories(clients, format_=args.format)
     jobs = generate_jobs(clients, command)
-    results = execute_jobs(
-        jobs, show_progress=True, number_of_workers=args.workers,
-        debug_jobs=args.debug)
-
-    output_results(results, hide_empty=args.hide_empty)
-
-    any_error = any(r['returncode'] for r in results)
-    return 1 if any_error else 0
+    return execute_and_output_jobs(jobs, args)
 
 
 def bzr_main(args=None):
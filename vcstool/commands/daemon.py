@@ -0,0 +1,70 @@
+import argparse
+import sys
+
+from vcstool.executor import ansi
+from vcstool.streams import set_streams
+from vcstool.util import get_daemon_socket_path
+
+from .command import Command
+
+
+class DaemonCommand(Command):
+
+    command = 'daemon'
+    help = 'Run the commands of vcs in a long running process'
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Run the commands invoked through vcs in a long running '
+                    'process which keeps the found repositories in memory',
+        prog='vcs daemon')
+    parser.formatter_class = argparse.ArgumentDefaultsHelpFormatter
+    group = parser.add_argument_group('"daemon" command parameters')
+    group.add_argument(
+        '--socket', metavar='PATH', default=get_daemon_socket_path(),
+        help='The Unix socket to listen on (the environment variable '
+             'VCSTOOL_DAEMON_SOCKET is used by vcs to find the daemon)')
+    group.add_argument(
+        '--no-watch', action='store_true', default=False,
+        help="Don't watch the directories for modifications using inotify "
+             'but check their modification times for every command')
+    group.add_argument(
+        '--status', action='store_true', default=False,
+        help='Check if the daemon is running')
+    group.add_argument(
+        '--stop', action='store_true', default=False,
+        help='Stop the running daemon')
+    return parser
+
+
+def main(args=None, stdout=None, stderr=None):
+    from vcstool.daemon import is_running
+    from vcstool.daemon import serve
+    from vcstool.daemon import stop
+    set_streams(stdout=stdout, stderr=stderr)
+
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    if args.status or args.stop:
+        running = stop(args.socket) if args.stop else is_running(args.socket)
+        if not running:
+            print("No daemon is serving '%s'" % args.socket, file=sys.stderr)
+            return 1
+        print("The daemon serving '%s' %s" % (
+            args.socket, 'has been stopped' if args.stop else 'is running'))
+        return 0
+
+    print("Serving the commands on '%s'" % args.socket)
+    sys.stdout.flush()
+    try:
+        serve(args.socket, watch=not args.no_watch)
+    except (OSError, RuntimeError) as e:
+        print(ansi('redf') + str(e) + ansi('reset'), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
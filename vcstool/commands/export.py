@@ -2,16 +2,19 @@ import argparse
 import os
 import sys
 
-from vcstool.crawler import find_repositories
 from vcstool.executor import ansi
 from vcstool.executor import execute_jobs
 from vcstool.executor import generate_jobs
+from vcstool.executor import NdjsonOutput
 from vcstool.executor import output_repositories
 from vcstool.executor import output_results
 from vcstool.streams import set_streams
 
 from .command import add_common_arguments
 from .command import Command
+from .command import find_command_repositories
+from .command import finish_execute_jobs
+from .command import get_execute_jobs_kwargs
 
 
 class ExportCommand(Command):
@@ -87,15 +90,24 @@ def main(args=None, stdout=None, stderr=None):
     set_streams(stdout=stdout, stderr=stderr)
 
     parser = get_parser()
-    add_common_arguments(parser, skip_hide_empty=True, path_nargs='?')
+    add_common_arguments(
+        parser, skip_hide_empty=True, skip_output_modes=True, path_nargs='?')
     args = parser.parse_args(args)
 
     command = ExportCommand(args)
-    clients = find_repositories(command.paths, nested=command.nested)
+    clients = find_command_repositories(command, args)
+    if clients is None:
+        return 1
     if command.output_repos:
-        output_repositories(clients)
+        output_repositories(clients, format_=args.format)
     jobs = generate_jobs(clients, command)
-    results = execute_jobs(jobs, number_of_workers=args.workers)
+    kwargs = get_execute_jobs_kwargs(jobs, args)
+    # the JSON objects contain the export data as well as the errors
+    ndjson_output = NdjsonOutput() if args.format == 'ndjson' else None
+    results = execute_jobs(jobs, result_handler=ndjson_output, **kwargs)
+    if ndjson_output:
+        finish_execute_jobs(kwargs)
+        return 1 if ndjson_output.any_error else 0
 
     # check if at least one repo was found in the client directory
     basename = None
@@ -114,6 +126,7 @@ def main(args=None, stdout=None, stderr=None):
     print('repositories:')
     output_results(results, output_handler=output_export_data)
     output_results(results, output_handler=output_error_information)
+    finish_execute_jobs(kwargs)
 
     any_error = any(r['returncode'] for r in results)
     return 1 if any_error else 0
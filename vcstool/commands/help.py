@@ -1,7 +1,7 @@
 import argparse
+import importlib
 import sys
 
-from pkg_resources import load_entry_point
 from vcstool.clients import vcstool_clients
 from vcstool.commands import vcstool_commands
 from vcstool.streams import set_streams
@@ -74,20 +74,22 @@ def get_parser(add_help=True):
 
 def get_entrypoint(command):
     # accept command with same prefix if unique
-    commands = [cmd.command for cmd in vcstool_commands]
-    commands = [cmd for cmd in commands if cmd.startswith(command)]
+    commands = [
+        cmd for cmd in vcstool_commands if cmd.command.startswith(command)]
     if len(commands) != 1:
         print(
             "vcs: '%s' is not a vcs command. See 'vcs help'." % command,
             file=sys.stderr)
         if commands:
             print(
-                '\nDid you mean one of these?\n' + '\n   '.join(commands),
+                '\nDid you mean one of these?\n' +
+                '\n   '.join(cmd.command for cmd in commands),
                 file=sys.stderr)
         return None
 
-    return load_entry_point(
-        'vcstool', 'console_scripts', 'vcs-' + commands[0])
+    # the main function of the module defining the command, same as the
+    # console script 'vcs-<command>' without looking up the entry point
+    return importlib.import_module(commands[0].__module__).main
 
 
 def get_parser_with_command_only():
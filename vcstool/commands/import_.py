@@ -2,26 +2,26 @@ import argparse
 import os
 from shutil import which
 import sys
-import urllib.request as request
 
 from vcstool import __version__ as vcstool_version
-from vcstool.clients import vcstool_clients
+from vcstool.clients import get_client_class
 from vcstool.clients.vcs_base import run_command
 from vcstool.executor import ansi
-from vcstool.executor import execute_jobs
+from vcstool.executor import Job
 from vcstool.executor import output_repositories
-from vcstool.executor import output_results
 from vcstool.streams import set_streams
-import yaml
 
 from .command import add_common_arguments
 from .command import Command
+from .command import execute_and_output_jobs
+from .command import RepositoryCommand
 
 
 class ImportCommand(Command):
 
     command = 'import'
     help = 'Import the list of repositories'
+    requires_network = True
 
     def __init__(
         self, args, url, version=None, recursive=False, shallow=False
@@ -36,6 +36,11 @@ class ImportCommand(Command):
         self.shallow = shallow
 
 
+class ImportRepositoryCommand(RepositoryCommand, ImportCommand):
+
+    __slots__ = ()
+
+
 def get_parser():
     parser = argparse.ArgumentParser(
         description='Import the list of repositories', prog='vcs import')
@@ -69,11 +74,13 @@ def file_or_url_type(value):
         return argparse.FileType('r')(value)
     # use another user agent to avoid getting a 403 (forbidden) error,
     # since some websites blacklist or block unrecognized user agents
+    from urllib import request
     return request.Request(
         value, headers={'User-Agent': 'vcstool/' + vcstool_version})
 
 
 def get_repositories(yaml_file):
+    import yaml
     try:
         root = yaml.safe_load(yaml_file)
     except yaml.YAMLError as e:
@@ -151,32 +158,38 @@ def get_repos_in_rosinstall_format(root):
 
 def generate_jobs(repos, args):
     jobs = []
+    # the arguments are stored once instead of for every repository
+    shared_command = ImportCommand(
+        args, None, recursive=args.recursive, shallow=args.shallow)
     for path, repo in repos.items():
         path = os.path.join(args.path, path)
-        clients = [c for c in vcstool_clients if c.type == repo['type']]
-        if not clients:
+        client = create_client(path, repo['type'])
+        if client is None:
             from vcstool.clients.none import NoneClient
-            job = {
-                'client': NoneClient(path),
-                'command': None,
-                'cwd': path,
-                'output':
-                    "Repository type '%s' is not supported" % repo['type'],
-                'returncode': NotImplemented
-            }
+            job = Job(
+                client=NoneClient(path),
+                command=None,
+                cwd=path,
+                output="Repository type '%s' is not supported" % repo['type'],
+                returncode=NotImplemented)
             jobs.append(job)
             continue
 
-        client = clients[0](path)
-        command = ImportCommand(
-            args, repo['url'],
-            str(repo['version']) if 'version' in repo else None,
-            recursive=args.recursive, shallow=args.shallow)
-        job = {'client': client, 'command': command}
+        command = ImportRepositoryCommand(
+            shared_command, repo['url'],
+            str(repo['version']) if 'version' in repo else None)
+        job = Job(client=client, command=command)
         jobs.append(job)
     return jobs
 
 
+def create_client(path, repository_type):
+    client_class = get_client_class(repository_type)
+    if client_class is None:
+        return None
+    return client_class(path)
+
+
 def add_dependencies(jobs):
     paths = [job['client'].path for job in jobs]
     for job in jobs:
@@ -192,6 +205,7 @@ def add_dependencies(jobs):
 
 
 def main(args=None, stdout=None, stderr=None):
+    from urllib import request
     set_streams(stdout=stdout, stderr=stderr)
 
     parser = get_parser()
@@ -211,12 +225,14 @@ def main(args=None, stdout=None, stderr=None):
     add_dependencies(jobs)
 
     if args.repos:
-        output_repositories([job['client'] for job in jobs])
+        output_repositories(
+            [job['client'] for job in jobs], format_=args.format)
 
     workers = args.workers
+    interactive = False
     # for ssh URLs check if the host is known to prevent ssh asking for
     # confirmation when using more than one worker
-    if workers > 1:
+    if workers is None or workers == 'auto' or workers > 1:
         ssh_keygen = None
         checked_hosts = set()
         for job in list(jobs):
@@ -241,20 +257,19 @@ def main(args=None, stdout=None, stderr=None):
 
             result = run_command([ssh_keygen, '-F', host], '')
             if result['returncode']:
+                # with the ndjson format stdout only contains JSON objects
                 print(
                     'At least one hostname (%s) is unknown, switching to a '
                     'single worker to allow interactively answering the ssh '
-                    'question to confirm the fingerprint' % host)
+                    'question to confirm the fingerprint' % host,
+                    file=sys.stderr if args.format == 'ndjson' else None)
                 workers = 1
+                # the processes aren't isolated from the terminal then
+                interactive = True
                 break
 
-    results = execute_jobs(
-        jobs, show_progress=True, number_of_workers=workers,
-        debug_jobs=args.debug)
-    output_results(results)
-
-    any_error = any(r['returncode'] for r in results)
-    return 1 if any_error else 0
+    return execute_and_output_jobs(
+        jobs, args, number_of_workers=workers, interactive=interactive)
 
 
 if __name__ == '__main__':
@@ -11,6 +11,7 @@ class PullCommand(Command):
 
     command = 'pull'
     help = 'Bring changes from the repository into the working copy'
+    requires_network = True
 
     def __init__(self, args):
         super(PullCommand, self).__init__(args)
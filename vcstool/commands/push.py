@@ -11,6 +11,7 @@ class PushCommand(Command):
 
     command = 'push'
     help = 'Push changes from the working copy to the repository'
+    requires_network = True
 
     def __init__(self, args):
         super(PushCommand, self).__init__(args)
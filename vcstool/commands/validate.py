@@ -1,21 +1,23 @@
 import argparse
 import sys
 
-from vcstool.clients import vcstool_clients
+from vcstool.commands.import_ import create_client
 from vcstool.commands.import_ import get_repositories
 from vcstool.executor import ansi
-from vcstool.executor import execute_jobs
-from vcstool.executor import output_results
+from vcstool.executor import Job
 from vcstool.streams import set_streams
 
 from .command import add_common_arguments
 from .command import Command
+from .command import execute_and_output_jobs
+from .command import RepositoryCommand
 
 
 class ValidateCommand(Command):
 
     command = 'validate'
     help = 'Validate the repository list file'
+    requires_network = True
 
     def __init__(self, args, url, version=None):
         super(ValidateCommand, self).__init__(args)
@@ -24,6 +26,11 @@ class ValidateCommand(Command):
         self.retry = args.retry
 
 
+class ValidateRepositoryCommand(RepositoryCommand, ValidateCommand):
+
+    __slots__ = ()
+
+
 def get_parser():
     parser = argparse.ArgumentParser(
         description='Validate a repositories file', prog='vcs validate')
@@ -38,27 +45,26 @@ def get_parser():
 
 def generate_jobs(repos, args):
     jobs = []
+    args.path = None  # expected to be present
+    # the arguments are stored once instead of for every repository
+    shared_command = ValidateCommand(args, None)
     for path, repo in repos.items():
-        clients = [c for c in vcstool_clients if c.type == repo['type']]
-        if not clients:
+        client = create_client(path, repo['type'])
+        if client is None:
             from vcstool.clients.none import NoneClient
-            job = {
-                'client': NoneClient(path),
-                'command': None,
-                'cwd': path,
-                'output':
-                    "Repository type '%s' is not supported" % repo['type'],
-                'returncode': NotImplemented
-            }
+            job = Job(
+                client=NoneClient(path),
+                command=None,
+                cwd=path,
+                output="Repository type '%s' is not supported" % repo['type'],
+                returncode=NotImplemented)
             jobs.append(job)
             continue
 
-        client = clients[0](path)
-        args.path = None  # expected to be present
-        command = ValidateCommand(
-            args, repo['url'],
+        command = ValidateRepositoryCommand(
+            shared_command, repo['url'],
             str(repo['version']) if 'version' in repo else None)
-        job = {'client': client, 'command': command}
+        job = Job(client=client, command=command)
         jobs.append(job)
     return jobs
 
@@ -77,15 +83,7 @@ def main(args=None, stdout=None, stderr=None):
         return 1
 
     jobs = generate_jobs(repos, args)
-
-    results = execute_jobs(
-        jobs, show_progress=True, number_of_workers=args.workers,
-        debug_jobs=args.debug)
-
-    output_results(results, hide_empty=args.hide_empty)
-
-    any_error = any(r['returncode'] for r in results)
-    return 1 if any_error else 0
+    return execute_and_output_jobs(jobs, args)
 
 
 if __name__ == '__main__':
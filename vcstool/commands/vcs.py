@@ -1,12 +1,22 @@
+import os
 import sys
 
 from vcstool.commands.help import get_entrypoint
 from vcstool.commands.help import get_parser
 from vcstool.commands.help import main as help_main
 from vcstool.streams import set_streams
+from vcstool.util import get_daemon_socket_path
 
 
 def main(args=None, stdout=None, stderr=None):
+    if args is None and stdout is None and stderr is None and \
+            os.path.exists(get_daemon_socket_path()):
+        # relay the invocation to a running daemon if available
+        from vcstool.daemon import forward_command
+        returncode = forward_command(sys.argv[1:])
+        if returncode is not None:
+            return returncode
+
     set_streams(stdout=stdout, stderr=stderr)
 
     # no help to extract command first (which might be followed by --help)
@@ -0,0 +1,96 @@
+import time
+
+from vcstool.retry import classify_failure
+from vcstool.retry import TRANSIENT
+
+
+def is_transient_failure(result):
+    # overloaded remotes or a congested network
+    if result.get('timed_out'):
+        return True
+    if not result['returncode'] or result['returncode'] == NotImplemented:
+        return False
+    return classify_failure(
+        result['output'], result['returncode']) == TRANSIENT
+
+
+class AdaptiveConcurrency(object):
+
+    # the limit is reduced to this fraction on congestion
+    DECREASE_FACTOR = 0.5
+    # a window is considered to be congested when the average latency of
+    # the jobs relative to their expected duration exceeds the best one so
+    # far by this factor
+    LATENCY_FACTOR = 2.0
+    # the minimum relative increase of the throughput to continue the slow
+    # start
+    IMPROVEMENT_THRESHOLD = 0.05
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        # double the limit until the throughput stops improving, afterwards
+        # only increase it by one per window
+        self._slow_start = True
+        self._best_throughput = None
+        self._best_latency = None
+        self._window_start = None
+        self._window_count = 0
+        self._window_latencies = []
+        self._window_failures = 0
+
+    def job_finished(self, result, now=None, expected_duration=None):
+        # the limit is adjusted after as many jobs as the current limit, the
+        # expected duration of the job, e.g. from previous invocations, is
+        # necessary to tell a slow repository apart from a congestion
+        if now is None:
+            now = time.monotonic()
+        duration = result.get('duration', 0.0)
+        if self._window_start is None:
+            self._window_start = now - duration
+        self._window_count += 1
+        if expected_duration:
+            self._window_latencies.append(duration / expected_duration)
+        if is_transient_failure(result):
+            self._window_failures += 1
+        if self._window_count < max(2, self.limit):
+            return
+        elapsed = now - self._window_start
+        throughput = self._window_count / elapsed if elapsed > 0 else None
+        latency = \
+            sum(self._window_latencies) / len(self._window_latencies) \
+            if self._window_latencies else None
+        self._adjust(throughput, latency, self._window_failures)
+        self._window_start = now
+        self._window_count = 0
+        self._window_latencies = []
+        self._window_failures = 0
+
+    def _adjust(self, throughput, latency, failures):
+        congested = failures or (
+            latency is not None and self._best_latency is not None and
+            latency > self._best_latency * self.LATENCY_FACTOR)
+        if latency is not None and (
+            self._best_latency is None or latency < self._best_latency
+        ):
+            self._best_latency = latency
+        if congested:
+            # multiplicative decrease
+            self._slow_start = False
+            self.limit = max(
+                self.minimum, int(self.limit * self.DECREASE_FACTOR))
+            return
+        if self._slow_start and throughput is not None:
+            if (
+                self._best_throughput is None or
+                throughput > self._best_throughput *
+                (1 + self.IMPROVEMENT_THRESHOLD)
+            ):
+                self._best_throughput = throughput
+            else:
+                self._slow_start = False
+        # additive increase of every window without congestion
+        self.limit = min(
+            self.maximum,
+            self.limit * 2 if self._slow_start else self.limit + 1)
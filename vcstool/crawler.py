@@ -1,41 +1,271 @@
+from fnmatch import fnmatch
 import os
 
-from . import vcstool_clients
+from .clients import get_client_class
+from .clients import vcstool_clients
+from .util import get_directory_key
 
+# the number of threads listing directories concurrently, the crawl is
+# dominated by the latency of the file system, e.g. on network mounts
+CRAWLER_WORKERS = 8
 
-def find_repositories(paths, nested=False):
+# a file in a base path listing patterns of directories to skip
+IGNORE_FILENAME = '.vcsignore'
+
+
+def find_repositories(
+    paths, nested=False, number_of_workers=None, index=None, exclude=None,
+    max_depth=None
+):
+    from concurrent.futures import ThreadPoolExecutor
     repos = []
-    visited = []
-    for path in paths:
-        _find_repositories(path, repos, visited, nested=nested)
+    # the visited directories keyed by their identity
+    visited = {}
+    with ThreadPoolExecutor(
+        max_workers=number_of_workers or CRAWLER_WORKERS
+    ) as pool:
+        for path in paths:
+            if index is not None:
+                index.add_root(path)
+            crawler = _Crawler(
+                repos, visited, nested, pool, index=index,
+                exclude=get_exclude_patterns(path, exclude),
+                max_depth=max_depth)
+            crawler.crawl(path)
     return repos
 
 
-def _find_repositories(path, repos, visited, nested=False):
-    abs_path = os.path.abspath(path)
-    if abs_path in visited:
-        return
-    visited.append(abs_path)
+def get_exclude_patterns(path, exclude=None):
+    # the patterns passed explicitly and the ones from the ignore file,
+    # a pattern containing a slash matches the path relative to the base
+    # path, otherwise it matches the name of a directory at any depth
+    patterns = list(exclude or [])
+    try:
+        with open(os.path.join(path, IGNORE_FILENAME), 'r') as h:
+            lines = h.read().splitlines()
+    except OSError:
+        lines = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            patterns.append(line)
+    result = []
+    for pattern in patterns:
+        pattern = pattern.replace(os.sep, '/').rstrip('/')
+        if pattern:
+            result.append(('/' in pattern, pattern.lstrip('/')))
+    return result
+
+
+def _get_metadata_directories():
+    return {
+        c.metadata_directory for c in vcstool_clients.get_clients()
+        if c.metadata_directory is not None}
 
-    client = get_vcs_client(path)
-    if client:
-        repos.append(client)
-        if not nested:
+
+class _Crawler(object):
+
+    def __init__(
+        self, repos, visited, nested, pool, index=None, exclude=None,
+        max_depth=None
+    ):
+        self.repos = repos
+        self.visited = visited
+        self.nested = nested
+        self.pool = pool
+        self.index = index
+        self.exclude = exclude or []
+        self.max_depth = max_depth
+        # the metadata of repositories never contains other repositories
+        self.skipped_names = _get_metadata_directories()
+
+    def crawl(self, path):
+        abs_path = os.path.abspath(path)
+        self._crawl(path, abs_path, '', 0, self._submit(path, abs_path))
+
+    def _submit(self, path, abs_path):
+        if self.index is not None and self.index.has_listing(abs_path):
+            # validating a listing from the index only requires a stat call
+            # which is cheaper than handing the directory to a thread
+            return _CompletedScan(
+                _scan_directory(path, self.nested, self.index, abs_path))
+        return self.pool.submit(
+            _scan_directory, path, self.nested, self.index, abs_path)
+
+    def _crawl(self, path, abs_path, relpath, depth, scan):
+        # the directories are visited depth first in sorted order while the
+        # listings of the subdirectories are already being fetched in
+        # parallel
+        key, client_class, subpaths = scan.result()
+        if key is None:
+            return
+        if key in self.visited:
+            self._add_duplicates(path, abs_path, self.visited[key])
             return
+        # the range of repositories found below the directory, the end is
+        # None while the directory is being crawled
+        visit = [path, abs_path, len(self.repos), None]
+        self.visited[key] = visit
+
+        self._crawl_directory(
+            path, abs_path, relpath, depth, key, client_class, subpaths)
+        visit[3] = len(self.repos)
+
+    def _crawl_directory(
+        self, path, abs_path, relpath, depth, key, client_class, subpaths
+    ):
+        if client_class:
+            client = client_class(path)
+            client.directory_key = key
+            self.repos.append(client)
+            if not self.nested:
+                return
+        if self.max_depth is not None and depth >= self.max_depth:
+            return
+
+        scans = []
+        for subpath in subpaths:
+            name = os.path.basename(subpath)
+            subrelpath = relpath + '/' + name if relpath else name
+            if self._is_skipped(name, subrelpath):
+                continue
+            abs_subpath = os.path.join(abs_path, name)
+            scans.append((
+                subpath, abs_subpath, subrelpath,
+                self._submit(subpath, abs_subpath)))
+        for subpath, abs_subpath, subrelpath, scan in scans:
+            self._crawl(subpath, abs_subpath, subrelpath, depth + 1, scan)
+
+    def _add_duplicates(self, path, abs_path, visit):
+        # a directory reached again through a different path, e.g. a
+        # symlink, isn't crawled again, instead the repositories found below
+        # it before are added with the different path to be reported as
+        # duplicates
+        visited_path, visited_abs_path, start, end = visit
+        if end is None or abs_path == visited_abs_path:
+            # a symlink to a parent directory or the same path again
+            return
+        for repo in self.repos[start:end]:
+            client = repo.__class__(path + repo.path[len(visited_path):])
+            client.directory_key = repo.directory_key
+            self.repos.append(client)
+
+    def _is_skipped(self, name, relpath):
+        if name in self.skipped_names:
+            return True
+        for anchored, pattern in self.exclude:
+            if fnmatch(relpath if anchored else name, pattern):
+                return True
+        return False
+
+
+class _CompletedScan(object):
+
+    # the same interface as the future of a scan run by a thread
+    def __init__(self, scan):
+        self._scan = scan
+
+    def result(self):
+        return self._scan
+
+
+def _scan_directory(path, nested, index=None, abs_path=None):
+    # return the identity of the directory, the client class if it is a
+    # repository and the paths of the subdirectories
+    if index is not None:
+        abs_path = abs_path or os.path.abspath(path)
+        listing = index.get_watched_listing(abs_path, nested)
+        if listing is not None:
+            scan = _get_indexed_scan(path, nested, *listing)
+            if scan is not None:
+                return scan
 
     try:
-        listdir = os.listdir(path)
+        stat_result = os.stat(path)
     except OSError:
-        listdir = []
-    for name in sorted(listdir):
-        subpath = os.path.join(path, name)
-        if not os.path.isdir(subpath):
+        return None, None, []
+    key = get_directory_key(path, stat_result)
+    if index is None:
+        return (key, ) + _list_directory(path, nested)[:2]
+
+    # the listing of an unmodified directory is taken from the index
+    mtime = stat_result.st_mtime_ns
+    listing = index.get_listing(abs_path, mtime, nested)
+    if listing is not None:
+        scan = _get_indexed_scan(path, nested, key, *listing)
+        if scan is not None:
+            return scan
+
+    client_class, subpaths, listed = _list_directory(path, nested)
+    if listed:
+        index.add_listing(
+            abs_path, mtime, client_class.type if client_class else None,
+            [os.path.basename(p) for p in subpaths]
+            if not client_class or nested else None, key=key)
+    return key, client_class, subpaths
+
+
+def _get_indexed_scan(path, nested, key, repository_type, names):
+    client_class = _get_client_class_by_type(repository_type)
+    if client_class is None and repository_type is not None:
+        # the client isn't available anymore
+        return None
+    if client_class and not nested:
+        return key, client_class, []
+    return key, client_class, [os.path.join(path, n) for n in names]
+
+
+def _list_directory(path, nested):
+    # a single listing is used to detect the repository type as well as to
+    # find the subdirectories, the type of most entries is known without
+    # an additional stat call
+    try:
+        entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+    except OSError:
+        return None, [], False
+    client_class = _get_client_class(path, entries)
+    if client_class and not nested:
+        return client_class, [], True
+    subpaths = [
+        os.path.join(path, entry.name) for entry in entries
+        if _is_directory(entry)]
+    return client_class, subpaths, True
+
+
+def _get_client_class(path, entries):
+    # only the module of the detected client is being imported
+    entries = {entry.name: entry for entry in entries}
+    for client in vcstool_clients.get_clients():
+        if client.metadata_directory is None:
+            # clients which can't be detected from the listing
+            if client.is_repository(path):
+                return get_client_class(client.type)
             continue
-        _find_repositories(subpath, repos, visited, nested=nested)
+        entry = entries.get(client.metadata_directory)
+        if entry is not None and _is_directory(entry):
+            client_class = get_client_class(client.type)
+            if client_class is not None:
+                return client_class
+    return None
+
+
+def _get_client_class_by_type(repository_type):
+    if repository_type is None:
+        return None
+    return get_client_class(repository_type)
+
+
+def _is_directory(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
 
 
 def get_vcs_client(path):
-    for client_class in vcstool_clients:
-        if client_class.is_repository(path):
-            return client_class(path)
-    return None
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return None
+    client_class = _get_client_class(path, entries)
+    return client_class(path) if client_class else None
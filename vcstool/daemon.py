@@ -0,0 +1,509 @@
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from vcstool.index import RACY_INTERVAL
+from vcstool.index import RepositoryIndex
+from vcstool.util import get_daemon_socket_path
+
+# the inotify events which change the listing of a directory
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+_EVENT_FORMAT = 'iIII'
+
+
+class InotifyWatcher(object):
+
+    MASK = (
+        IN_ATTRIB | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVED_FROM |
+        IN_MOVED_TO | IN_MOVE_SELF | IN_ONLYDIR)
+
+    def __init__(self, callback):
+        # the callback is invoked with the path of a modified directory or
+        # None if events have been lost
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library('c'), use_errno=True)
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._fd = fd
+        self._callback = callback
+        self._lock = threading.Lock()
+        self._descriptors = {}
+        # the same directory might be reached through multiple paths
+        self._paths = {}
+        thread = threading.Thread(target=self._read_events)
+        thread.daemon = True
+        thread.start()
+
+    def add(self, path):
+        with self._lock:
+            if path in self._descriptors:
+                return True
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            # e.g. the limit of watches per user has been reached
+            return False
+        with self._lock:
+            self._descriptors[path] = wd
+            self._paths.setdefault(wd, set()).add(path)
+        return True
+
+    def is_watched(self, path):
+        return path in self._descriptors
+
+    def _read_events(self):
+        import select
+        import struct
+        event_size = struct.calcsize(_EVENT_FORMAT)
+        while True:
+            select.select([self._fd], [], [])
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset + event_size <= len(data):
+                wd, mask, _, length = struct.unpack_from(
+                    _EVENT_FORMAT, data, offset)
+                offset += event_size + length
+                if mask & IN_Q_OVERFLOW:
+                    self._remove_all()
+                    self._callback(None)
+                    continue
+                with self._lock:
+                    paths = set(self._paths.get(wd, ()))
+                if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    # the paths don't refer to the watched directory anymore
+                    self._remove(wd)
+                for path in paths:
+                    self._callback(path)
+
+    def _remove(self, wd):
+        with self._lock:
+            paths = self._paths.pop(wd, ())
+            for path in paths:
+                self._descriptors.pop(path, None)
+        if paths:
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _remove_all(self):
+        with self._lock:
+            descriptors = list(self._paths.keys())
+        for wd in descriptors:
+            self._remove(wd)
+
+
+class WatchedRepositoryIndex(RepositoryIndex):
+
+    def __init__(self, watcher=None):
+        super(WatchedRepositoryIndex, self).__init__()
+        # without a watcher the modification time of every directory is
+        # still checked, but the listings are kept in memory
+        self.watcher = watcher
+        self._keys = {}
+
+    def load(self):
+        # the index is only kept in memory
+        pass
+
+    def save(self):
+        self._updated = {}
+        self._added = set()
+        self._roots = {}
+
+    def clear(self):
+        self.directories = {}
+        self._keys = {}
+
+    def invalidate(self, path=None):
+        if path is None:
+            self.clear()
+            return
+        self.directories.pop(path, None)
+        self._keys.pop(path, None)
+
+    def get_watched_listing(self, path, nested):
+        if self.watcher is None or not self.watcher.is_watched(path):
+            return None
+        listing = self.directories.get(path)
+        key = self._keys.get(path)
+        if listing is None or key is None:
+            return None
+        _, repository_type, names = listing
+        if names is None and (nested or repository_type is None):
+            return None
+        return key, repository_type, names
+
+    def add_listing(self, path, mtime, repository_type, names, key=None):
+        if time.time() - mtime / 1e9 < RACY_INTERVAL:
+            return False
+        if self.watcher is not None:
+            self.watcher.add(path)
+        self.directories[path] = [mtime, repository_type, names]
+        self._keys[path] = key
+        # a modification before the watch has been added wouldn't be noticed
+        try:
+            unmodified = os.stat(path).st_mtime_ns == mtime
+        except OSError:
+            unmodified = False
+        if not unmodified:
+            self.invalidate(path)
+        return True
+
+
+class _ForwardedStream(io.TextIOBase):
+
+    def __init__(self, name, send, isatty=False):
+        self.name = name
+        self._send = send
+        self._isatty = isatty
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def isatty(self):
+        return self._isatty
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self._lock:
+            self._buffer.append(text)
+        if '\n' in text:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            text = ''.join(self._buffer)
+            self._buffer = []
+        if text:
+            self._send({self.name: text})
+
+
+class _ForwardedStdin(io.TextIOBase):
+
+    # the standard input of the client is only requested when being read
+    def __init__(self, send, isatty=False):
+        self.name = '<stdin>'
+        self._send = send
+        self._isatty = isatty
+        self._data = None
+        self._received = threading.Event()
+        self._buffer = None
+
+    def isatty(self):
+        return self._isatty
+
+    def readable(self):
+        return True
+
+    def set_data(self, data):
+        # the content of the standard input or None if the client has
+        # disconnected
+        self._data = data
+        self._received.set()
+
+    def read(self, size=-1):
+        return self._get_buffer().read(size)
+
+    def readline(self, size=-1):
+        return self._get_buffer().readline(size)
+
+    def _get_buffer(self):
+        if self._buffer is None:
+            self._send({'read_stdin': True})
+            self._received.wait()
+            self._buffer = io.StringIO(self._data or '')
+        return self._buffer
+
+
+def run_request(request, send, stdin=None):
+    # run a command like it would have been invoked by the client, the
+    # daemon handles only a single request at a time
+    import logging
+    from vcstool import streams
+    from vcstool.commands.vcs import main
+    from vcstool.executor import logger
+    from vcstool.executor import set_use_color
+    from vcstool.executor import use_color
+
+    stdout = _ForwardedStream(
+        'stdout', send, isatty=request.get('stdout_isatty', False))
+    stderr = _ForwardedStream(
+        'stderr', send, isatty=request.get('stderr_isatty', False))
+    if stdin is None:
+        stdin = _ForwardedStdin(
+            send, isatty=request.get('stdin_isatty', False))
+    # the debug messages are output to the client and the log level set by
+    # --debug only applies to this request
+    log_handler = logging.StreamHandler(stderr)
+    log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    log_level, log_propagate = logger.level, logger.propagate
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    color = use_color()
+    previous_streams = (streams.stdout, streams.stderr)
+    previous_sys_streams = (sys.stdin, sys.stdout, sys.stderr)
+    try:
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request.get('env', {}))
+        set_use_color(bool(request.get('color')))
+        sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+        logger.addHandler(log_handler)
+        logger.propagate = False
+        try:
+            return main(list(request['args']), stdout=stdout, stderr=stderr)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code
+            print(e.code, file=stderr)
+            return 1
+    except Exception:
+        import traceback
+        traceback.print_exc(file=stderr)
+        return 1
+    finally:
+        stdout.flush()
+        stderr.flush()
+        logger.removeHandler(log_handler)
+        logger.setLevel(log_level)
+        logger.propagate = log_propagate
+        sys.stdin, sys.stdout, sys.stderr = previous_sys_streams
+        streams.set_streams(*previous_streams)
+        set_use_color(color)
+        os.environ.clear()
+        os.environ.update(environ)
+        os.chdir(cwd)
+
+
+def serve(socket_path, watch=True):
+    import socketserver
+    from vcstool.clients.vcs_base import cancel_commands
+    from vcstool.clients.vcs_base import reset_cancellation
+    from vcstool.clients.vcs_base import set_always_isolate_processes
+    from vcstool.index import set_shared_index
+
+    index = WatchedRepositoryIndex()
+    if watch and sys.platform.startswith('linux'):
+        try:
+            index.watcher = InotifyWatcher(index.invalidate)
+        except (AttributeError, OSError):
+            # fall back to checking the modification times
+            pass
+    set_shared_index(index)
+    set_always_isolate_processes(True)
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            self._lock = threading.Lock()
+            self._running = False
+            self._disconnected = False
+            try:
+                request = json.loads(self.rfile.readline().decode())
+            except ValueError:
+                return
+            if request.get('stop'):
+                self.send({'returncode': 0})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            stdin = _ForwardedStdin(
+                self.send, isatty=request.get('stdin_isatty', False))
+            # the connection is read while the command is running to receive
+            # the standard input and to notice when the client disconnects
+            reset_cancellation()
+            self._running = True
+            reader = threading.Thread(
+                target=self._read_messages, args=(stdin, ))
+            reader.daemon = True
+            reader.start()
+            try:
+                returncode = run_request(request, self.send, stdin=stdin)
+            finally:
+                with self._lock:
+                    self._running = False
+            self.send({'returncode': returncode or 0})
+
+        def _read_messages(self, stdin):
+            # the socket is read directly since closing the buffered reader
+            # at the end of the request would block while it is being read
+            data = b''
+            try:
+                while True:
+                    chunk = self.connection.recv(65536)
+                    if not chunk:
+                        break
+                    data += chunk
+                    while b'\n' in data:
+                        line, data = data.split(b'\n', 1)
+                        message = json.loads(line.decode())
+                        if 'stdin' in message:
+                            stdin.set_data(message['stdin'])
+            except (OSError, ValueError):
+                pass
+            stdin.set_data(None)
+            self._disconnect()
+
+        def send(self, message):
+            if self._disconnected:
+                return
+            try:
+                self.wfile.write((json.dumps(message) + '\n').encode())
+                self.wfile.flush()
+            except OSError:
+                self._disconnect()
+
+        def _disconnect(self):
+            # stop running commands when nobody is waiting for them
+            with self._lock:
+                self._disconnected = True
+                if not self._running:
+                    return
+            cancel_commands('the client disconnected')
+
+    if is_running(socket_path):
+        raise RuntimeError(
+            "Another daemon is already serving '%s'" % socket_path)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    os.makedirs(os.path.dirname(socket_path) or os.curdir, exist_ok=True)
+    # only the user may connect since the commands run on their behalf
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, RequestHandler)
+    finally:
+        os.umask(umask)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.remove(socket_path)
+        except OSError:
+            pass
+
+
+def _connect(socket_path):
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def is_running(socket_path):
+    sock = _connect(socket_path)
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def stop(socket_path):
+    sock = _connect(socket_path)
+    if sock is None:
+        return False
+    with sock:
+        sock.sendall(b'{"stop": true}\n')
+        sock.makefile('rb').readline()
+    return True
+
+
+def forward_command(args, socket_path=None):
+    # run the command in a running daemon and output its results, return
+    # None if the command should be run locally instead
+    if os.name == 'nt' or os.environ.get('VCSTOOL_NO_DAEMON'):
+        return None
+    if args and 'daemon'.startswith(args[0]):
+        return None
+    if any(_is_client_file(arg) for arg in args):
+        return None
+    sock = _connect(socket_path or get_daemon_socket_path())
+    if sock is None:
+        return None
+
+    stdout_isatty = _isatty(sys.stdout)
+    request = {
+        'args': args,
+        'cwd': os.getcwd(),
+        'env': dict(os.environ),
+        'color': stdout_isatty,
+        'stdin_isatty': _isatty(sys.stdin),
+        'stdout_isatty': stdout_isatty,
+        'stderr_isatty': _isatty(sys.stderr),
+    }
+    # closing the connection cancels the command in the daemon
+    with sock, sock.makefile('rb') as h:
+        try:
+            sock.sendall((json.dumps(request) + '\n').encode())
+            for line in h:
+                message = json.loads(line.decode())
+                if message.get('read_stdin'):
+                    data = sys.stdin.read() if sys.stdin is not None else ''
+                    sock.sendall(
+                        (json.dumps({'stdin': data}) + '\n').encode())
+                for name in ('stdout', 'stderr'):
+                    if name in message:
+                        stream = getattr(sys, name)
+                        try:
+                            stream.write(message[name])
+                            stream.flush()
+                        except BrokenPipeError:
+                            # e.g. piped into head, the output which can't
+                            # be flushed anymore is discarded
+                            _redirect_to_devnull(stream)
+                            return 1
+                if 'returncode' in message:
+                    return message['returncode']
+        except KeyboardInterrupt:
+            return 130
+    print('vcs: the daemon closed the connection', file=sys.stderr)
+    return 1
+
+
+def _isatty(stream):
+    return hasattr(stream, 'isatty') and stream.isatty()
+
+
+def _is_client_file(arg):
+    # the file descriptors of the client, e.g. /dev/stdin or a process
+    # substitution like <(...), can't be opened by the daemon
+    if arg.startswith('-'):
+        arg = arg.split('=', 1)[-1]
+    return arg == '/dev/stdin' or arg.startswith(('/dev/fd/', '/proc/self/'))
+
+
+def _redirect_to_devnull(stream):
+    try:
+        fileno = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, fileno)
+    os.close(devnull)
@@ -1,8 +1,13 @@
+from collections import deque
+from collections.abc import MutableMapping
+import heapq
+import json
 import logging
 import os
 from queue import Empty, Queue
 import sys
 import threading
+import time
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -21,40 +26,146 @@ def fix_output_path(path):
     return path.replace('\\', '/') if windows_force_posix else path
 
 
-def output_repositories(clients):
+def output_repositories(clients, format_='text'):
+    # with the ndjson format stdout only contains the JSON objects
+    from vcstool.streams import stderr
     from vcstool.streams import stdout
     ordered_clients = {client.path: client for client in clients}
     for k in sorted(ordered_clients.keys()):
         client = ordered_clients[k]
         print(
             '%s (%s)' % (fix_output_path(k), client.__class__.type),
-            file=stdout)
+            file=stderr if format_ == 'ndjson' else stdout)
 
 
 def generate_jobs(clients, command):
+    from vcstool.util import get_directory_key
     jobs = []
-    realpaths = {}
+    paths = {}
     for client in clients:
         # check if client is a duplicate of another path
-        realpath = os.path.realpath(client.path)
-        if realpath not in realpaths:
-            realpaths[realpath] = [client.path]
+        key = getattr(client, 'directory_key', None) or \
+            get_directory_key(client.path)
+        if key not in paths:
+            paths[key] = client.path
         else:
             # override command on client to ignore multiple invocations
             # on same repository
-            duplicate_path = realpaths[realpath][0]
-            realpaths[realpath].append(client.path)
+            duplicate_path = paths[key]
             method_name = command.__class__.command
             method = getattr(client, method_name, None)
             if method is not None:
                 setattr(client, method_name, DuplicateCommandHandler(
                     client, duplicate_path))
 
-        job = {'client': client, 'command': command}
+        job = Job(client=client, command=command)
         jobs.append(job)
     return jobs
 
 
+class _SlotsMapping(MutableMapping):
+
+    # the attributes are accessible like the keys of a dictionary for
+    # backward compatibility, keys without a slot are stored in a dictionary
+    __slots__ = ('_extra', )
+    _fields = ()
+
+    def __init__(self, *args, **kwargs):
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        try:
+            return self._extra[key]
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            setattr(self, key, value)
+            return
+        try:
+            extra = self._extra
+        except AttributeError:
+            extra = self._extra = {}
+        extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._fields:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+            return
+        try:
+            del self._extra[key]
+        except AttributeError:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.__slots__:
+            if hasattr(self, key):
+                yield key
+        yield from getattr(self, '_extra', ())
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self))
+
+
+class Job(_SlotsMapping):
+
+    __slots__ = (
+        'client', 'command', 'depends', 'host', 'ready', 'cwd', 'output',
+        'returncode')
+    _fields = frozenset(__slots__)
+
+
+class Result(_SlotsMapping):
+
+    __slots__ = (
+        'job', 'cmd', 'cwd', 'output', 'returncode', 'export_data', 'start',
+        'duration', 'subprocesses', 'worker', 'live_output', 'streamed',
+        'timed_out',
+        'cancelled', 'host_unavailable', 'path')
+    _fields = frozenset(__slots__)
+
+    @classmethod
+    def create(cls, job, result):
+        # same as merging the job into the result dictionary, except that
+        # the keys only present in the job are looked up instead of copied
+        instance = cls(result)
+        instance.job = job
+        for key in ('cwd', 'output', 'returncode'):
+            if key in job:
+                instance[key] = job[key]
+        return instance
+
+    def __getitem__(self, key):
+        try:
+            return super(Result, self).__getitem__(key)
+        except KeyError:
+            job = getattr(self, 'job', None)
+            if job is None or key == 'job':
+                raise
+            return job[key]
+
+    def __iter__(self):
+        keys = list(super(Result, self).__iter__())
+        yield from keys
+        job = getattr(self, 'job', None)
+        if job is not None:
+            for key in job:
+                if key not in keys:
+                    yield key
+
+
 class DuplicateCommandHandler(object):
 
     def __init__(self, client, duplicate_path):
@@ -70,18 +181,124 @@ class DuplicateCommandHandler(object):
         }
 
 
-def get_ready_job(jobs):
-    for job in jobs:
-        if not job.get('depends', set()):
-            jobs.remove(job)
+class JobScheduler(object):
+
+    def __init__(self, jobs, estimate_duration=None, host_limits=None):
+        # jobs which are ready to be processed grouped by their host, for
+        # each host the ones with the longest estimated duration first and
+        # otherwise in their original order
+        self._ready = {}
+        self._priorities = self._get_priorities(jobs, estimate_duration)
+        # the hosts with ready jobs which are served in a round robin fashion
+        self._hosts = deque()
+        self._host_limits = host_limits
+        self._running_per_host = {}
+        # the jobs waiting for a specific path to be finished
+        self._dependents = {}
+        # the number of unfinished dependencies of each waiting job
+        self._indegrees = {}
+
+        paths = {job['client'].path for job in jobs}
+        for job in jobs:
+            depends = [
+                path for path in job.get('depends', ()) if path in paths]
+            if not depends:
+                self._add_ready_job(job)
+                continue
+            self._indegrees[id(job)] = len(depends)
+            for path in depends:
+                self._dependents.setdefault(path, []).append(job)
+
+    @staticmethod
+    def _get_priorities(jobs, estimate_duration):
+        estimates = [
+            estimate_duration(job) if estimate_duration else None
+            for job in jobs]
+        # jobs without an estimate are assumed to take an average duration
+        known_estimates = [e for e in estimates if e is not None]
+        default_estimate = sum(known_estimates) / len(known_estimates) \
+            if known_estimates else 0.0
+        return {
+            id(job): (
+                -(estimate if estimate is not None else default_estimate), i)
+            for i, (job, estimate) in enumerate(zip(jobs, estimates))}
+
+    def get_ready_job(self):
+        # the next host which hasn't reached its limit yet
+        for _ in range(len(self._hosts)):
+            host = self._hosts[0]
+            self._hosts.rotate(-1)
+            limit = self._host_limits.get_limit(host) \
+                if self._host_limits else None
+            running = self._running_per_host.get(host, 0)
+            if limit is not None and running >= limit:
+                continue
+            ready = self._ready[host]
+            job = heapq.heappop(ready)[-1]
+            if not ready:
+                del self._ready[host]
+                self._hosts.remove(host)
+            self._running_per_host[host] = running + 1
             return job
-    return None
+        return None
+
+    def finish_job(self, job):
+        self._running_per_host[job.get('host')] -= 1
+        # only the direct dependents of the finished path need to be updated
+        for dependent in self._dependents.pop(job['client'].path, ()):
+            self._indegrees[id(dependent)] -= 1
+            if not self._indegrees[id(dependent)]:
+                del self._indegrees[id(dependent)]
+                self._add_ready_job(dependent)
+
+    def has_pending_jobs(self):
+        return bool(self._ready or self._indegrees)
+
+    def drop_pending_jobs(self):
+        # remove all ready and waiting jobs and return them in priority order
+        pending = {
+            id(job): job
+            for ready in self._ready.values() for _, _, job in ready}
+        for dependents in self._dependents.values():
+            for job in dependents:
+                pending[id(job)] = job
+        self._ready = {}
+        self._hosts.clear()
+        self._dependents = {}
+        self._indegrees = {}
+        return sorted(
+            pending.values(), key=lambda job: self._priorities[id(job)])
+
+    def _add_ready_job(self, job):
+        # remember since when the job isn't waiting for dependencies anymore
+        job['ready'] = time.time()
+        host = job.get('host')
+        if host not in self._ready:
+            self._ready[host] = []
+            self._hosts.append(host)
+        heapq.heappush(self._ready[host], self._priorities[id(job)] + (job, ))
+
+
+EXECUTORS = ('threads', 'asyncio')
+
+# the default number of jobs running concurrently with the asyncio executor
+ASYNCIO_MAX_PROCESSES = 64
+
+FORMATS = ('text', 'ndjson')
 
 
 def execute_jobs(
-    jobs, show_progress=False, number_of_workers=10, debug_jobs=False
+    jobs, show_progress=False, number_of_workers=10, debug_jobs=False,
+    executor='threads', result_handler=None, live_output=False,
+    result_observers=(), duration_history=None, timeout=None,
+    subprocess_timeout=None, fail_fast=False, deadline=None,
+    host_limits=None, concurrency=None, circuit_breaker=None,
+    max_processes=None, interactive=False
 ):
     global windows_force_posix
+    from vcstool.clients.vcs_base import cancel_commands
+    from vcstool.clients.vcs_base import get_cancellation_reason
+    from vcstool.clients.vcs_base import reset_cancellation
     from vcstool.streams import stdout
     if debug_jobs:
         logger.setLevel(logging.DEBUG)
@@ -94,88 +311,320 @@ def execute_jobs(
     job_queue = Queue()
     result_queue = Queue()
 
+    # with the asyncio executor the subprocesses of all jobs are spawned and
+    # read by a single event loop instead of the individual worker threads,
+    # the client methods are synchronous though so each running job still
+    # waits for the loop in a worker thread
+    subprocess_loop = None
+    if executor == 'asyncio' and jobs:
+        from vcstool.asyncio_executor import SubprocessLoop
+        if max_processes:
+            number_of_workers = min(number_of_workers, max_processes)
+        subprocess_loop = SubprocessLoop(number_of_workers)
+        subprocess_loop.start()
+    else:
+        assert executor in EXECUTORS, "Unknown executor '%s'" % executor
+
     # create worker threads
     workers = []
-    for _ in range(min(number_of_workers, len(jobs))):
-        worker = Worker(job_queue, result_queue)
+    for i in range(min(number_of_workers, len(jobs))):
+        worker = Worker(
+            job_queue, result_queue, subprocess_runner=(
+                subprocess_loop.run_subprocess if subprocess_loop else None),
+            live_output=live_output, timeout=timeout,
+            subprocess_timeout=subprocess_timeout,
+            circuit_breaker=circuit_breaker)
+        worker.name = 'worker-%d' % (i + 1)
         workers.append(worker)
 
-    # fill job_queue with jobs for each worker
-    pending_jobs = list(jobs)
+    # start the jobs which took the longest in previous runs first
+    estimate_duration = duration_history.get_duration \
+        if duration_history else None
+    scheduler = JobScheduler(
+        jobs, estimate_duration=estimate_duration, host_limits=host_limits)
+
+    # on a terminal render a progress line which is continuously updated,
+    # otherwise output a single character for each finished job
+    show_progress = show_progress and len(jobs) > 1
+    progress_display = None
+    if (
+        show_progress and not debug_jobs and
+        hasattr(stdout, 'isatty') and stdout.isatty()
+    ):
+        from vcstool.progress import ProgressDisplay
+        progress_display = ProgressDisplay(
+            stdout, jobs,
+            concurrency.limit if concurrency else number_of_workers,
+            estimate_duration=estimate_duration)
+
     running_job_paths = []
-    while job_queue.qsize() < len(workers):
-        job = get_ready_job(pending_jobs)
-        if not job:
-            break
-        running_job_paths.append(job['client'].path)
-        logger.debug("started '%s'" % job['client'].path)
-        job_queue.put(job)
+
+    def start_ready_jobs():
+        # fill job_queue with jobs for each worker, with an adaptive
+        # concurrency only up to its current limit of jobs being processed
+        while (
+            len(running_job_paths) < concurrency.limit if concurrency
+            else job_queue.qsize() < len(workers)
+        ):
+            job = scheduler.get_ready_job()
+            if job is None:
+                break
+            running_job_paths.append(job['client'].path)
+            logger.debug("started '%s'" % job['client'].path)
+            job_queue.put(job)
+
+    # with fail fast or a deadline every process is isolated to be able to
+    # kill its process tree, on Ctrl-C the terminal signals the whole tree,
+    # interactive processes stay attached to the terminal to be able to
+    # prompt though, on timeouts only the process itself is killed then
+    reset_cancellation(
+        isolate_processes=fail_fast or deadline is not None,
+        interactive=interactive)
+    previous_sigint_handler = _install_sigint_handler(cancel_commands)
+
+    start_ready_jobs()
     logger.debug('ongoing %s' % running_job_paths)
 
     # start all workers
     [w.start() for w in workers]
 
-    # collect results
-    while len(results) < len(jobs):
-        (job, result) = result_queue.get()
-        logger.debug("finished '%s'" % job['client'].path)
-        running_job_paths.remove(result['job']['client'].path)
-        if show_progress and len(jobs) > 1:
-            if result['returncode'] == NotImplemented:
-                stdout.write('s')
-            elif result['returncode']:
-                stdout.write('E')
-            else:
-                stdout.write('.')
+    def handle_result(job, result):
+        result = Result.create(job, result)
+        # the duration of an interrupted or skipped job isn't representative
+        if duration_history and not result.get('cancelled') and \
+                not result.get('host_unavailable'):
+            duration_history.add_result(result)
+        if 'start' in result:
+            for observer in result_observers:
+                observer(result)
+        if result_handler:
+            result_handler(result)
+        else:
+            results.append(result)
+
+    def get_wait_timeout():
+        # wake up periodically to update the progress line and in time to
+        # cancel all jobs when reaching the deadline
+        timeouts = []
+        if progress_display:
+            timeouts.append(progress_display.interval)
+        if deadline is not None and get_cancellation_reason() is None:
+            timeouts.append(max(0.0, deadline - time.monotonic()))
+        return min(timeouts) if timeouts else None
+
+    def output_progress(job, result):
+        if progress_display:
+            progress_display.job_finished(job, result)
+        elif show_progress:
+            stdout.write(_get_progress_character(result))
             if debug_jobs:
                 stdout.write('\n')
             stdout.flush()
-        result.update(job)
-        results.append(result)
-        if pending_jobs:
-            for pending_job in pending_jobs:
-                pending_job.get('depends', set()).discard(job['client'].path)
-            while job_queue.qsize() < len(workers):
-                job = get_ready_job(pending_jobs)
-                if not job:
-                    break
-                running_job_paths.append(job['client'].path)
-                logger.debug("started '%s'" % job['client'].path)
-                job_queue.put(job)
-            assert running_job_paths
-        if running_job_paths:
-            logger.debug('ongoing ' + str(running_job_paths))
-    if show_progress and len(jobs) > 1 and not debug_jobs:
+
+    def drop_pending_jobs():
+        # none of the pending jobs is being started anymore after cancelling
+        reason = get_cancellation_reason()
+        pending_jobs = scheduler.drop_pending_jobs()
+        for job in pending_jobs:
+            logger.debug("dropped '%s'" % job['client'].path)
+            result = get_skipped_result(job, reason)
+            output_progress(job, result)
+            handle_result(job, result)
+        return len(pending_jobs)
+
+    # collect results, if a result handler is passed the results are handed
+    # to it as soon as they are available instead of being returned
+    finished_jobs = 0
+    try:
+        while finished_jobs < len(jobs):
+            if (
+                deadline is not None and time.monotonic() >= deadline and
+                get_cancellation_reason() is None
+            ):
+                cancel_commands('the deadline has been reached')
+                finished_jobs += drop_pending_jobs()
+                continue
+            try:
+                (job, result) = result_queue.get(timeout=get_wait_timeout())
+            except Empty:
+                if progress_display:
+                    progress_display.update()
+                continue
+            if result is None:
+                # a worker has started processing the job
+                if progress_display:
+                    progress_display.job_started(job)
+                continue
+            finished_jobs += 1
+            logger.debug("finished '%s'" % job['client'].path)
+            running_job_paths.remove(result['job']['client'].path)
+            output_progress(job, result)
+            if (
+                fail_fast and result['returncode'] and
+                result['returncode'] != NotImplemented and
+                not result.get('cancelled')
+            ):
+                cancel_commands(
+                    "the command failed in '%s'" %
+                    fix_output_path(job['client'].path))
+            if concurrency and not result.get('cancelled'):
+                limit = concurrency.limit
+                concurrency.job_finished(
+                    result, expected_duration=estimate_duration(job)
+                    if estimate_duration else None)
+                if concurrency.limit != limit:
+                    logger.debug(
+                        'changed concurrency from %d to %d' %
+                        (limit, concurrency.limit))
+                    if progress_display:
+                        progress_display.number_of_workers = \
+                            concurrency.limit
+            handle_result(job, result)
+            scheduler.finish_job(job)
+            if get_cancellation_reason() is not None:
+                finished_jobs += drop_pending_jobs()
+            elif scheduler.has_pending_jobs():
+                start_ready_jobs()
+                assert running_job_paths
+            if running_job_paths:
+                logger.debug('ongoing ' + str(running_job_paths))
+    finally:
+        _restore_sigint_handler(previous_sigint_handler)
+    if progress_display:
+        progress_display.finish()
+    elif show_progress and not debug_jobs:
         print('', file=stdout)  # finish progress line
 
-    # join all workers
-    for w in workers:
-        w.done = True
+    # stop all workers once they are idle and join them
+    for _ in workers:
+        job_queue.put(None)
     [w.join() for w in workers]
+    if subprocess_loop:
+        subprocess_loop.stop()
     return results
 
 
+def _get_progress_character(result):
+    if result['returncode'] == NotImplemented:
+        return 's'
+    if result.get('timed_out'):
+        return 'T'
+    if result.get('cancelled'):
+        return 'C'
+    if result['returncode']:
+        return 'E'
+    return '.'
+
+
+def _install_sigint_handler(cancel_commands):
+    # the first Ctrl-C cancels all jobs and still outputs the partial
+    # results, a second one raises a KeyboardInterrupt as usual
+    if threading.current_thread() is not threading.main_thread():
+        return None
+    import signal
+
+    def handler(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        cancel_commands('the execution has been interrupted')
+
+    return signal.signal(signal.SIGINT, handler)
+
+
+def _restore_sigint_handler(previous_handler):
+    if previous_handler is not None:
+        import signal
+        signal.signal(signal.SIGINT, previous_handler)
+
+
 class Worker(threading.Thread):
 
-    def __init__(self, job_queue, result_queue):
+    def __init__(
+        self, job_queue, result_queue, subprocess_runner=None,
+        live_output=False, timeout=None, subprocess_timeout=None,
+        circuit_breaker=None
+    ):
         super(Worker, self).__init__()
         self.daemon = True
-        self.done = False
         self.job_queue = job_queue
         self.result_queue = result_queue
+        self.subprocess_runner = subprocess_runner
+        self.live_output = live_output
+        # the timeout in seconds for each job and each of its subprocesses
+        self.timeout = timeout
+        self.subprocess_timeout = subprocess_timeout
+        self.circuit_breaker = circuit_breaker
 
     def run(self):
-        # process all incoming jobs
-        while not self.done:
-            try:
-                # fetch next job
-                job = self.job_queue.get(timeout=0.1)
-                # process job
+        from vcstool.clients.vcs_base import get_cancellation_reason
+        from vcstool.clients.vcs_base import has_been_cancelled
+        from vcstool.clients.vcs_base import has_timed_out
+        from vcstool.clients.vcs_base import set_command_timeout
+        from vcstool.clients.vcs_base import set_output_line_handler
+        from vcstool.clients.vcs_base import set_retry_condition
+        from vcstool.clients.vcs_base import set_subprocess_records
+        from vcstool.clients.vcs_base import set_subprocess_runner
+        from vcstool.clients.vcs_base import TIMEOUT_RETURNCODE
+        set_subprocess_runner(self.subprocess_runner)
+        # process all incoming jobs until receiving the sentinel
+        while True:
+            # block until the next job is available
+            job = self.job_queue.get()
+            if job is None:
+                break
+            self.result_queue.put((job, None))
+            # process job
+            if self.live_output:
+                line_handler = LiveOutputLineHandler(job['client'].path)
+                set_output_line_handler(line_handler)
+            subprocess_records = []
+            set_subprocess_records(subprocess_records)
+            start = time.time()
+            start_clock = time.monotonic()
+            set_command_timeout(
+                deadline=start_clock + self.timeout
+                if self.timeout is not None else None,
+                timeout=self.subprocess_timeout)
+            # stop retrying once the host of the job is considered down
+            host = job.get('host')
+            breaker = self.circuit_breaker if host is not None else None
+            set_retry_condition(
+                (lambda: not breaker.is_open(host)) if breaker else None)
+            reason = get_cancellation_reason()
+            processed = False
+            if reason is not None:
+                result = get_skipped_result(job, reason)
+            elif breaker and breaker.is_open(host):
+                result = breaker.get_failed_result(job)
+            else:
                 result = self.process_job(job)
-                # send result
-                self.result_queue.put((job, result))
-            except Empty:
-                pass
+                processed = True
+            if has_timed_out():
+                self._mark_incomplete(
+                    result, 'timed_out', TIMEOUT_RETURNCODE, 'Timed out')
+            elif has_been_cancelled():
+                self._mark_incomplete(result, 'cancelled', 1, 'Cancelled')
+            # a timeout counts as a connection failure even if the client
+            # hasn't passed on the result of the killed subprocess
+            if breaker and processed:
+                breaker.record(host, result)
+            result['start'] = start
+            result['duration'] = time.monotonic() - start_clock
+            result['subprocesses'] = subprocess_records
+            result['worker'] = self.name
+            if self.live_output:
+                result['live_output'] = line_handler.any_output
+            # send result
+            self.result_queue.put((job, result))
+
+    def _mark_incomplete(self, result, key, returncode, message):
+        # a client might have ignored the failure of the killed subprocess
+        result[key] = True
+        if not result['returncode'] or \
+                result['returncode'] == NotImplemented:
+            result['returncode'] = returncode
+            result['output'] = (
+                result['output'] + '\n' if result['output'] else '') + \
+                message
 
     def process_job(self, job):
         command = job['command']
@@ -222,6 +671,17 @@ class Worker(threading.Thread):
             }
 
 
+def get_skipped_result(job, reason):
+    # the result of a job which hasn't been started due to the cancellation
+    return {
+        'cmd': '',
+        'job': job,
+        'output': 'Not started since ' + reason,
+        'returncode': 1,
+        'cancelled': True,
+    }
+
+
 def output_result(result, hide_empty=False):
     from vcstool.streams import stdout
     output = result['output']
@@ -253,6 +713,128 @@ def output_result(result, hide_empty=False):
                 file=stdout)
 
 
+# serialize the lines output by multiple workers
+_live_output_lock = threading.Lock()
+
+
+def output_live_line(path, line):
+    from vcstool.streams import stdout
+    with _live_output_lock:
+        print(
+            ansi('bluef') + fix_output_path(path) + ansi('reset') + ': ' +
+            line, file=stdout)
+        stdout.flush()
+
+
+class LiveOutputLineHandler(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.any_output = False
+
+    def __call__(self, line):
+        self.any_output = True
+        output_live_line(
+            self.path, line.rstrip(b'\r\n').decode('utf8', 'replace'))
+
+
+class LiveOutput(object):
+
+    def __init__(self, hide_empty=False):
+        self.hide_empty = hide_empty
+        self.any_error = False
+
+    def __call__(self, result):
+        if result['returncode']:
+            self.any_error = True
+        # the output of the live commands has already been output line by
+        # line, only messages not coming from a subprocess and errors remain
+        if result.get('live_output'):
+            output = ''
+            if result.get('timed_out') or result.get('cancelled'):
+                # the message why the subprocess has been killed
+                output = result['output'].splitlines()[-1]
+            elif result['returncode'] and \
+                    result['returncode'] != NotImplemented:
+                # the output of a failed command which isn't live, e.g. a
+                # probe, hasn't been output yet
+                output = result['output'] if not result.get('streamed') \
+                    else 'Failed with return code %d' % result['returncode']
+        else:
+            output = result['output']
+            if self.hide_empty and result['returncode'] is None:
+                output = ''
+        for line in output.splitlines():
+            output_live_line(result['client'].path, line)
+
+
+class OrderedOutput(object):
+
+    def __init__(self, jobs, output_handler=output_result, hide_empty=False):
+        self.output_handler = output_handler
+        self.hide_empty = hide_empty
+        self.any_error = False
+        # same as output_results only the last result for a path is output
+        self._pending_jobs = {}
+        for job in jobs:
+            path = job['client'].path
+            self._pending_jobs[path] = self._pending_jobs.get(path, 0) + 1
+        self._paths_in_order = deque(sorted(self._pending_jobs.keys()))
+        # the results which can't be output yet since the result of an
+        # alphabetically earlier path is still missing
+        self._results = {}
+
+    def __call__(self, result):
+        if result['returncode']:
+            self.any_error = True
+        path = result['client'].path
+        self._pending_jobs[path] -= 1
+        self._results[path] = result
+        # output all consecutive results in alphabetic order
+        while self._paths_in_order:
+            path = self._paths_in_order[0]
+            if self._pending_jobs[path]:
+                break
+            self._paths_in_order.popleft()
+            self.output_handler(
+                self._results.pop(path), hide_empty=self.hide_empty)
+
+
+class NdjsonOutput(object):
+
+    def __init__(self):
+        self.any_error = False
+
+    def __call__(self, result):
+        from vcstool.streams import stdout
+        if result['returncode']:
+            self.any_error = True
+        # one line per result as soon as it is available
+        print(json.dumps(get_result_data(result)), file=stdout)
+        stdout.flush()
+
+
+def get_result_data(result):
+    # the JSON serializable information of a result
+    command = result['command']
+    not_applicable = result['returncode'] == NotImplemented
+    data = {
+        'path': fix_output_path(result['client'].path),
+        'client': result['client'].__class__.type,
+        'command': command.__class__.command if command else None,
+        'cmd': result['cmd'],
+        'returncode': result['returncode'] if not not_applicable else None,
+        'output': result['output'],
+        'duration': result.get('duration'),
+    }
+    if not_applicable:
+        data['not_applicable'] = True
+    for key in ('timed_out', 'cancelled', 'host_unavailable', 'export_data'):
+        if key in result:
+            data[key] = result[key]
+    return data
+
+
 def output_results(results, output_handler=output_result, hide_empty=False):
     # output results in alphabetic order
     path_to_idx = {
@@ -268,6 +850,16 @@ if os.name == 'nt' and os.environ.get('ConEmuANSI', None) != 'ON':
     USE_COLOR = False
 
 
+def use_color():
+    return USE_COLOR
+
+
+def set_use_color(value):
+    # e.g. for each command run by the daemon depending on its client
+    global USE_COLOR
+    USE_COLOR = value
+
+
 def ansi(keyword):
     if not USE_COLOR:
         return ''
@@ -0,0 +1,70 @@
+import json
+import os
+
+from vcstool.util import get_cache_path
+
+# weight of the latest duration compared to the previously recorded ones
+SMOOTHING_FACTOR = 0.5
+
+
+class DurationHistory(object):
+
+    def __init__(self, path=None):
+        self.path = path or get_cache_path('durations.json')
+        # the durations in seconds keyed by the absolute path of the
+        # repository and the command name
+        self.durations = {}
+        self._updated = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as h:
+                durations = json.load(h)
+        except (OSError, ValueError):
+            return
+        if isinstance(durations, dict):
+            self.durations = durations
+
+    def save(self):
+        if not self._updated:
+            return
+        # merge the updated durations into the latest content of the file
+        # since other invocations might have updated it in the meantime
+        self.load()
+        for path, commands in self._updated.items():
+            self.durations.setdefault(path, {}).update(commands)
+        tmp_path = '%s.%d' % (self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'w') as h:
+                json.dump(self.durations, h, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # the history is only an optimization
+            pass
+        self._updated = {}
+
+    def get_duration(self, job):
+        key = _get_key(job)
+        if key is None:
+            return None
+        return self.durations.get(key[0], {}).get(key[1])
+
+    def add_result(self, result):
+        key = _get_key(result)
+        if key is None or 'duration' not in result:
+            return
+        duration = result['duration']
+        previous = self.durations.get(key[0], {}).get(key[1])
+        if previous is not None:
+            duration = SMOOTHING_FACTOR * duration + \
+                (1 - SMOOTHING_FACTOR) * previous
+        self.durations.setdefault(key[0], {})[key[1]] = duration
+        self._updated.setdefault(key[0], {})[key[1]] = duration
+
+
+def _get_key(job):
+    if not job['command']:
+        return None
+    return (
+        os.path.abspath(job['client'].path), job['command'].__class__.command)
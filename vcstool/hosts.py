@@ -0,0 +1,124 @@
+import argparse
+import re
+import threading
+from urllib.parse import urlsplit
+
+from vcstool.retry import CONNECTION_ERROR_PATTERN
+
+
+class HostLimits(object):
+
+    def __init__(self, default=None, overrides=None):
+        # the maximum number of concurrent jobs per host, None for no limit
+        self.default = default
+        self.overrides = overrides or {}
+
+    def get_limit(self, host):
+        if host is None:
+            return None
+        return self.overrides.get(host, self.default)
+
+
+def host_limit(value):
+    # either a number for all hosts or HOST=N for a specific host
+    host, sep, limit = value.rpartition('=')
+    if sep and not host:
+        raise argparse.ArgumentTypeError("invalid host in '%s'" % value)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid int value: '%s'" % value)
+    if limit <= 0:
+        raise argparse.ArgumentTypeError(
+            "invalid positive int value: '%s'" % value)
+    return (host.lower() or None, limit)
+
+
+def get_host_limits(values):
+    if not values:
+        return None
+    host_limits = HostLimits()
+    for host, limit in values:
+        if host is None:
+            host_limits.default = limit
+        else:
+            host_limits.overrides[host] = limit
+    return host_limits
+
+
+def get_url_host(url):
+    if not url:
+        return None
+    if '://' in url:
+        try:
+            return urlsplit(url).hostname
+        except ValueError:
+            return None
+    # scp-like syntax, e.g. git@github.com:user/repo.git, but not a path
+    # containing a colon or a Windows drive letter
+    match = re.match(r'^(?:[^@/]+@)?([^:/]+):', url)
+    if match and len(match.group(1)) > 1:
+        return match.group(1).lower()
+    return None
+
+
+def get_job_host(job):
+    # the URL of the command if available, e.g. for import, otherwise the
+    # remote of the existing repository
+    command = job['command']
+    if command is None:
+        return None
+    url = getattr(command, 'url', None) or job['client'].get_remote_url()
+    return get_url_host(url)
+
+
+def assign_hosts(jobs):
+    # only jobs of commands requiring network access are limited per host
+    for job in jobs:
+        if job['command'] is not None and \
+                getattr(job['command'], 'requires_network', False):
+            job['host'] = get_job_host(job)
+
+
+def is_connection_failure(result):
+    if not result['returncode'] or result['returncode'] == NotImplemented:
+        return False
+    if result.get('timed_out'):
+        return True
+    return bool(CONNECTION_ERROR_PATTERN.search(result['output'] or ''))
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, threshold):
+        # the number of consecutive connection failures after which all
+        # remaining jobs of a host fail immediately
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._open = set()
+
+    def record(self, host, result):
+        if host is None:
+            return
+        with self._lock:
+            if is_connection_failure(result):
+                self._failures[host] = self._failures.get(host, 0) + 1
+                if self._failures[host] >= self.threshold:
+                    self._open.add(host)
+            elif not result['returncode']:
+                self._failures[host] = 0
+
+    def is_open(self, host):
+        return host in self._open
+
+    def get_failed_result(self, job):
+        return {
+            'cmd': '',
+            'job': job,
+            'output':
+                "Not started since %d consecutive jobs for host '%s' failed "
+                'to connect' % (self.threshold, job['host']),
+            'returncode': 1,
+            'host_unavailable': True,
+        }
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+
+from vcstool.util import get_cache_path
+
+# directories modified this recently aren't recorded since another
+# modification within the granularity of the timestamps wouldn't be noticed
+RACY_INTERVAL = 2.0
+
+
+class RepositoryIndex(object):
+
+    def __init__(self, path=None):
+        # the directory containing an index file for each crawled base path,
+        # this keeps loading and saving the index of a workspace independent
+        # of the number of other workspaces
+        self.path = path or get_cache_path('index')
+        # the listings keyed by the absolute path of the directory, each one
+        # is a list of the modification time in nanoseconds, the type of the
+        # repository or None and the names of the subdirectories or None if
+        # they haven't been listed
+        self.directories = {}
+        self._load = False
+        self._updated = {}
+        self._added = set()
+        # the paths of the stored listings for each crawled base path
+        self._roots = {}
+
+    def load(self):
+        # use the stored listings of the base paths being crawled
+        self._load = True
+        for root in self._roots.keys():
+            self._roots[root] = self._load_root(root)
+
+    def _load_root(self, root):
+        try:
+            with open(self._get_root_path(root), 'r') as h:
+                directories = json.load(h)
+        except (OSError, ValueError):
+            return set()
+        if not isinstance(directories, dict):
+            return set()
+        self.directories.update(directories)
+        return set(directories.keys())
+
+    def save(self):
+        # write the listings of the directories below each crawled base path,
+        # the ones which haven't been visited, e.g. since they don't exist
+        # anymore, are dropped
+        for root, stored in self._roots.items():
+            prefix = os.path.join(root, '')
+            directories = {
+                path: listing for path, listing in self._updated.items()
+                if path == root or path.startswith(prefix)}
+            if set(directories.keys()) == stored and \
+                    not self._added.intersection(stored):
+                # the file already contains the same listings
+                continue
+            path = self._get_root_path(root)
+            tmp_path = '%s.%d' % (path, os.getpid())
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                with open(tmp_path, 'w') as h:
+                    json.dump(directories, h, sort_keys=True)
+                os.replace(tmp_path, path)
+            except OSError:
+                # the index is only an optimization
+                pass
+        self._updated = {}
+        self._added = set()
+        self._roots = {}
+
+    def _get_root_path(self, root):
+        import hashlib
+        name = hashlib.sha1(root.encode('utf-8', 'surrogateescape'))
+        return os.path.join(self.path, name.hexdigest() + '.json')
+
+    def clear(self):
+        self.directories = {}
+
+    def add_root(self, path):
+        path = os.path.abspath(path)
+        if path not in self._roots:
+            self._roots[path] = self._load_root(path) if self._load else set()
+
+    def has_listing(self, path):
+        # whether the directory might be unmodified since it was listed
+        return path in self.directories
+
+    def get_listing(self, path, mtime, nested):
+        # return the type of the repository and the names of the
+        # subdirectories if the directory hasn't been modified since
+        listing = self.directories.get(path)
+        if not isinstance(listing, list) or len(listing) != 3 or \
+                listing[0] != mtime:
+            return None
+        _, repository_type, names = listing
+        if names is None and (nested or repository_type is None):
+            return None
+        self._updated[path] = listing
+        return repository_type, names
+
+    def get_watched_listing(self, path, nested):
+        # return the identity of the directory, the type of the repository
+        # and the names of the subdirectories if the directory is known to
+        # be unmodified without checking its modification time, only
+        # possible when the directories are being watched
+        return None
+
+    def add_listing(self, path, mtime, repository_type, names, key=None):
+        if time.time() - mtime / 1e9 < RACY_INTERVAL:
+            return False
+        self._updated[path] = [mtime, repository_type, names]
+        self._added.add(path)
+        return True
+
+
+_shared_index = None
+
+
+def get_shared_index():
+    return _shared_index
+
+
+def set_shared_index(index):
+    # an index kept in memory by a long running process, e.g. the daemon
+    global _shared_index
+    _shared_index = index
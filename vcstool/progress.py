@@ -0,0 +1,140 @@
+import shutil
+import time
+
+
+class ProgressDisplay(object):
+
+    def __init__(
+        self, stream, jobs, number_of_workers, estimate_duration=None,
+        interval=0.2
+    ):
+        self.stream = stream
+        self.total = len(jobs)
+        self.number_of_workers = max(1, min(number_of_workers, len(jobs)))
+        self.interval = interval
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self._start_clock = time.monotonic()
+        self._last_draw = None
+        self._last_line_length = 0
+        # the jobs which have been started with the time they started
+        self._running = {}
+
+        # the estimated durations based on previous runs
+        self._estimates = {}
+        if estimate_duration:
+            for job in jobs:
+                estimate = estimate_duration(job)
+                if estimate is not None:
+                    self._estimates[id(job)] = estimate
+        self._default_estimate = \
+            sum(self._estimates.values()) / len(self._estimates) \
+            if self._estimates else None
+        self._remaining_estimate = sum(
+            self._estimates.get(id(job), self._default_estimate or 0.0)
+            for job in jobs)
+        # the ratio between the actual and the estimated durations so far
+        self._actual_duration = 0.0
+        self._estimated_duration = 0.0
+
+    def job_started(self, job):
+        self._running[id(job)] = (job['client'].path, time.monotonic())
+        self.update()
+
+    def job_finished(self, job, result):
+        self._running.pop(id(job), None)
+        self.completed += 1
+        if result['returncode'] and result['returncode'] != NotImplemented:
+            self.failed += 1
+        if result.get('timed_out'):
+            self.timed_out += 1
+        if result.get('cancelled'):
+            self.cancelled += 1
+        estimate = self._get_estimate(job)
+        self._remaining_estimate -= estimate
+        if id(job) in self._estimates and 'duration' in result:
+            self._actual_duration += result['duration']
+            self._estimated_duration += estimate
+        self.update()
+
+    def update(self, force=False):
+        now = time.monotonic()
+        if (
+            not force and self._last_draw is not None and
+            now - self._last_draw < self.interval
+        ):
+            return
+        self._last_draw = now
+        self._draw(self.get_line(now))
+
+    def finish(self):
+        # remove the progress line
+        self._draw('')
+
+    def get_line(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self._start_clock
+        parts = ['[%d/%d]' % (self.completed, self.total)]
+        if self.failed:
+            parts.append('%d failed' % self.failed)
+        if self.timed_out:
+            parts.append('%d timed out' % self.timed_out)
+        if self.cancelled:
+            parts.append('%d cancelled' % self.cancelled)
+        if elapsed > 0 and self.completed:
+            parts.append('%.1f jobs/s' % (self.completed / elapsed))
+        eta = self.get_eta(now)
+        if eta is not None:
+            parts.append('ETA ' + _format_duration(eta))
+        line = ', '.join(parts)
+        if self._running:
+            running = sorted(
+                self._running.values(), key=lambda running: running[1])
+            line += ' - ' + ' '.join(path for path, _ in running)
+        width = shutil.get_terminal_size().columns - 1
+        if len(line) > width:
+            line = line[:max(0, width - 3)] + '...'
+        return line
+
+    def get_eta(self, now):
+        remaining_jobs = self.total - self.completed
+        if not remaining_jobs:
+            return 0.0
+        if self._default_estimate is not None:
+            # the estimated work of all pending jobs and the remainder of the
+            # running jobs, scaled by how accurate the estimates were so far
+            remaining = self._remaining_estimate
+            for job_id, (_, start) in self._running.items():
+                remaining -= min(
+                    self._estimates.get(job_id, self._default_estimate),
+                    now - start)
+            if self._estimated_duration:
+                remaining *= self._actual_duration / self._estimated_duration
+            return max(0.0, remaining) / self.number_of_workers
+        # without any history extrapolate the throughput so far
+        elapsed = now - self._start_clock
+        if not self.completed or elapsed <= 0:
+            return None
+        return remaining_jobs * elapsed / self.completed
+
+    def _get_estimate(self, job):
+        return self._estimates.get(id(job), self._default_estimate or 0.0)
+
+    def _draw(self, line):
+        padding = ' ' * max(0, self._last_line_length - len(line))
+        self.stream.write('\r' + line + padding + ('\r' if not line else ''))
+        self.stream.flush()
+        self._last_line_length = len(line)
+
+
+def _format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return '%ds' % seconds
+    if seconds < 3600:
+        return '%dm%02ds' % divmod(seconds, 60)
+    hours, seconds = divmod(seconds, 3600)
+    return '%dh%02dm' % (hours, seconds // 60)
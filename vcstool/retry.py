@@ -0,0 +1,111 @@
+import re
+import threading
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# output indicating that a remote host couldn't be reached
+CONNECTION_ERROR_PATTERN = re.compile(
+    r'Could not resolve host|Temporary failure in name resolution|'
+    r'Connection (timed out|refused|reset)|No route to host|'
+    r'Network is unreachable|Operation timed out|'
+    r'remote end hung up unexpectedly|ssh: connect to host',
+    re.IGNORECASE)
+
+# output indicating a temporary problem of the remote or the network
+TRANSIENT_ERROR_PATTERN = re.compile(
+    CONNECTION_ERROR_PATTERN.pattern + '|' +
+    r'early EOF|RPC failed|rate limit|Too Many Requests|'
+    r'Service Unavailable|Bad Gateway|Gateway Time-?out|'
+    r'HTTP (Error )?(408|429|5\d\d)|returned error: (408|429|5\d\d)|'
+    r'gnutls_handshake|SSL_ERROR_SYSCALL|unexpected disconnect',
+    re.IGNORECASE)
+
+# output indicating a failure which won't go away by retrying
+PERMANENT_ERROR_PATTERN = re.compile(
+    r'Authentication failed|Permission denied|'
+    r'could not read (Username|Password)|Invalid username or password|'
+    r'Repository not found|does not appear to be a git repository|'
+    r"couldn't find remote ref|did not match any|unknown revision|"
+    r'not a valid (object|ref)|'
+    r'HTTP (Error )?(401|403|404)|returned error: (401|403|404)|'
+    r'E170013|E215004',
+    re.IGNORECASE)
+
+# the return codes of shells for commands which can't be invoked
+PERMANENT_RETURNCODES = (126, 127)
+
+# the HTTP status codes of temporary problems of a server
+TRANSIENT_HTTP_CODES = (408, 429, 500, 502, 503, 504)
+
+
+def classify_failure(output, returncode=None):
+    # return TRANSIENT, PERMANENT or None if the failure is unknown
+    if returncode in PERMANENT_RETURNCODES:
+        return PERMANENT
+    output = output or ''
+    if PERMANENT_ERROR_PATTERN.search(output):
+        return PERMANENT
+    if TRANSIENT_ERROR_PATTERN.search(output):
+        return TRANSIENT
+    return None
+
+
+def classify_url_error(e):
+    # classify an HTTPError or URLError raised by urlopen
+    import socket
+    code = getattr(e, 'code', None)
+    if code is not None:
+        return TRANSIENT if code in TRANSIENT_HTTP_CODES else PERMANENT
+    reason = getattr(e, 'reason', None)
+    if isinstance(reason, (socket.timeout, ConnectionError)):
+        return TRANSIENT
+    if isinstance(reason, socket.gaierror) and \
+            reason.errno == socket.EAI_AGAIN:
+        return TRANSIENT
+    return None
+
+
+class RetryPolicy(object):
+
+    def __init__(self, base_delay=1.0, max_delay=30.0, budget=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # the maximum number of retries in total, None for no limit
+        self.budget = budget
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def should_retry(self, classification):
+        # unknown failures are still being retried, each retry is taken
+        # from the budget
+        if classification == PERMANENT:
+            return False
+        with self._lock:
+            if self.budget is not None and self.retries >= self.budget:
+                return False
+            self.retries += 1
+        return True
+
+    def get_delay(self, attempt, base_delay=None):
+        # capped exponential backoff with jitter to avoid retrying in sync
+        # when multiple workers fail at the same time, at least half of the
+        # delay is kept to still back off
+        import random
+        if base_delay is None:
+            base_delay = self.base_delay
+        delay = min(self.max_delay, base_delay * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+_retry_policy = RetryPolicy()
+
+
+def get_retry_policy():
+    return _retry_policy
+
+
+def set_retry_policy(policy):
+    # the policy is shared by all threads for the whole invocation
+    global _retry_policy
+    _retry_policy = policy
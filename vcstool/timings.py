@@ -0,0 +1,106 @@
+import csv
+import json
+
+from vcstool.executor import fix_output_path
+
+FIELDNAMES = (
+    'kind', 'path', 'client', 'command', 'cmd', 'cwd', 'start', 'duration',
+    'returncode')
+
+
+class Timings(object):
+
+    def __init__(self, output=True, top=10, path=None):
+        self.output = output
+        self.top = top
+        self.path = path
+        self.jobs = []
+        self.subprocesses = []
+
+    def __call__(self, result):
+        # only keep the timing information and not the output of the result
+        path = result['client'].path
+        self.jobs.append({
+            'kind': 'job',
+            'path': path,
+            'client': result['client'].__class__.type,
+            'command': result['command'].__class__.command
+            if result['command'] else None,
+            'cmd': result['cmd'],
+            'cwd': result.get('cwd'),
+            'start': result['start'],
+            'duration': result['duration'],
+            'returncode': _get_returncode(result['returncode']),
+        })
+        for record in result['subprocesses']:
+            row = {
+                'kind': 'subprocess',
+                'path': path,
+                'client': self.jobs[-1]['client'],
+                'command': self.jobs[-1]['command'],
+            }
+            row.update(record)
+            self.subprocesses.append(row)
+
+    def finish(self):
+        if self.output:
+            output_timings(self, top=self.top)
+        if self.path:
+            write_timings(self, self.path)
+
+    def get_rows(self):
+        return sorted(
+            self.jobs + self.subprocesses, key=lambda row: row['start'])
+
+    def get_wall_time(self):
+        if not self.jobs:
+            return 0.0
+        start = min(job['start'] for job in self.jobs)
+        end = max(job['start'] + job['duration'] for job in self.jobs)
+        return end - start
+
+
+def _get_returncode(returncode):
+    # NotImplemented can't be represented in the written files
+    return returncode if returncode != NotImplemented else None
+
+
+def output_timings(timings, top=10):
+    from vcstool.streams import stderr
+    lines = []
+    lines.append('Slowest repositories:')
+    for job in sorted(
+        timings.jobs, key=lambda job: job['duration'], reverse=True
+    )[:top]:
+        lines.append('  %8.3fs  %s (%s)' % (
+            job['duration'], fix_output_path(job['path']), job['client']))
+    lines.append('Slowest subprocesses:')
+    for record in sorted(
+        timings.subprocesses, key=lambda record: record['duration'],
+        reverse=True
+    )[:top]:
+        lines.append('  %8.3fs  %s: %s' % (
+            record['duration'], fix_output_path(record['path']),
+            record['cmd']))
+    lines.append(
+        'Total: %d repositories in %.3fs wall time (%.3fs summed), '
+        '%d subprocesses in %.3fs summed' % (
+            len(timings.jobs), timings.get_wall_time(),
+            sum(job['duration'] for job in timings.jobs),
+            len(timings.subprocesses),
+            sum(record['duration'] for record in timings.subprocesses)))
+    print('\n'.join(lines), file=stderr)
+
+
+def write_timings(timings, path):
+    # the format is determined by the file extension, CSV being the default
+    rows = timings.get_rows()
+    with open(path, 'w', newline='') as h:
+        if path.endswith('.json'):
+            json.dump(rows, h, indent=2)
+            h.write('\n')
+            return
+        writer = csv.DictWriter(h, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
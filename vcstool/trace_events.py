@@ -0,0 +1,96 @@
+import json
+
+
+class Trace(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = []
+
+    def __call__(self, result):
+        # only keep the timing information and not the output of the result
+        self.jobs.append({
+            'path': result['client'].path,
+            'client': result['client'].__class__.type,
+            'command': result['command'].__class__.command
+            if result['command'] else None,
+            'depends': sorted(result.get('depends', ())),
+            'ready': result.get('ready', result['start']),
+            'start': result['start'],
+            'duration': result['duration'],
+            'returncode': result['returncode']
+            if result['returncode'] != NotImplemented else None,
+            'worker': result.get('worker', 'main'),
+            'subprocesses': [
+                {
+                    'cmd': record['cmd'],
+                    'start': record['start'],
+                    'duration': record['duration'],
+                    'returncode': record['returncode'],
+                } for record in result['subprocesses']],
+        })
+
+    def finish(self):
+        with open(self.path, 'w') as h:
+            json.dump(
+                {'traceEvents': self.get_events(), 'displayTimeUnit': 'ms'},
+                h)
+            h.write('\n')
+
+    def get_events(self):
+        if not self.jobs:
+            return []
+        # all jobs are created when the execution starts which is also when
+        # the jobs without any dependencies are ready
+        origin = min(job['ready'] for job in self.jobs)
+
+        def us(timestamp):
+            return round((timestamp - origin) * 1e6)
+
+        events = []
+        workers = sorted(
+            {job['worker'] for job in self.jobs},
+            key=lambda worker: (len(worker), worker))
+        tids = {worker: i + 1 for i, worker in enumerate(workers)}
+        for worker, tid in tids.items():
+            events.append({
+                'ph': 'M', 'name': 'thread_name', 'pid': 1, 'tid': tid,
+                'args': {'name': worker}})
+
+        for i, job in enumerate(self.jobs):
+            tid = tids[job['worker']]
+            args = {
+                'client': job['client'], 'returncode': job['returncode']}
+            if job['depends']:
+                args['depends'] = job['depends']
+            events.append({
+                'ph': 'X', 'cat': 'job', 'name': job['path'],
+                'ts': us(job['start']), 'dur': round(job['duration'] * 1e6),
+                'pid': 1, 'tid': tid, 'args': args})
+            for record in job['subprocesses']:
+                events.append({
+                    'ph': 'X', 'cat': 'subprocess', 'name': record['cmd'],
+                    'ts': us(record['start']),
+                    'dur': round(record['duration'] * 1e6),
+                    'pid': 1, 'tid': tid,
+                    'args': {
+                        'path': job['path'],
+                        'returncode': record['returncode']}})
+
+            # the time waiting for the dependencies to finish
+            # and afterwards for an idle worker
+            waits = [('waiting for a worker', job['ready'], job['start'])]
+            if job['depends']:
+                waits.insert(
+                    0, ('waiting for dependencies', origin, job['ready']))
+            for name, start, end in waits:
+                if end <= start:
+                    continue
+                events.append({
+                    'ph': 'b', 'cat': 'wait', 'name': name, 'id': i,
+                    'ts': us(start), 'pid': 1, 'tid': tid,
+                    'args': {'path': job['path']}})
+                events.append({
+                    'ph': 'e', 'cat': 'wait', 'name': name, 'id': i,
+                    'ts': us(end), 'pid': 1, 'tid': tid})
+        return events
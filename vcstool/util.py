@@ -5,6 +5,31 @@ import stat
 import sys
 
 
+def get_cache_path(filename):
+    # follow the XDG base directory specification on all platforms
+    cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'vcstool', filename)
+
+
+def get_daemon_socket_path():
+    return os.environ.get('VCSTOOL_DAEMON_SOCKET') or \
+        get_cache_path('daemon.sock')
+
+
+def get_directory_key(path, stat_result=None):
+    # identify a directory independent of the path it is reached through
+    try:
+        if stat_result is None:
+            stat_result = os.stat(path)
+    except OSError:
+        return os.path.abspath(path)
+    if stat_result.st_ino:
+        return (stat_result.st_dev, stat_result.st_ino)
+    # some file systems don't provide inode numbers
+    return os.path.realpath(path)
+
+
 def rmtree(path):
     kwargs = {}
     if sys.platform == 'win32':